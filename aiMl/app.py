@@ -1,17 +1,60 @@
-from flask import Flask, request, jsonify
-from main import get_live_features
-from model import AquaScopeModel
-from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, abort
+from main import get_live_features, prefetch_batch
+from geocache import normalize_name
+from singleflight import SingleFlight
+from model import shared_model
+from jobs import JobStore, JobScheduler, MAX_JOB_LOCATIONS
+from metrics import registry, watch_executor, queue_depth, MonitoredExecutor, HTTP_SECONDS, ADMISSION_DECISIONS
+from main import fetch_pool
+from cache import start_purge_loop as start_cache_purge_loop
+from respcache import RenderedResponseCache
+from spatial import ScoredLocationIndex, MAX_NEARBY_RADIUS_KM
+from predlog import PredictionLog, PREDLOG_MAX_DAYS
+from watchlist import Watchlist
+from riskgrid import RiskGridReader, tile_bbox, start_scheduler as start_risk_grid_scheduler
+from concurrent.futures import wait, FIRST_COMPLETED
 import traceback
+import html
+import json
+import os
+import time
+import datetime
+import fcntl
+import threading
 
 app = Flask(__name__)
 
-# Initialize model once
-model = AquaScopeModel()
-model.train_dummy()
+# Load the persisted model once (trains and saves one on first run); serve.py loads it before forking
+model = shared_model()
 
-# Create a small thread pool to handle multiple requests safely
-executor = ThreadPoolExecutor(max_workers=5)
+# Thread pool for batch fan-out and background refreshes (per worker process under serve.py)
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", "5"))
+executor = MonitoredExecutor(max_workers=EXECUTOR_WORKERS)
+
+# Backlog (tasks queued on the request and fetch pools) at which new live work gets a short
+# latency budget and is served partly from last known values, and at which it is refused
+ADMISSION_DEGRADE_DEPTH = int(os.getenv("ADMISSION_DEGRADE_DEPTH", "32"))
+ADMISSION_SHED_DEPTH = int(os.getenv("ADMISSION_SHED_DEPTH", "256"))
+DEGRADED_BUDGET_MS = float(os.getenv("DEGRADED_BUDGET_MS", "1000"))
+
+# Streamed batches are prefetched (multi-location upstream requests) this many locations at a time
+STREAM_PREFETCH_CHUNK = int(os.getenv("STREAM_PREFETCH_CHUNK", "32"))
+
+# Background services (job resume, watchlist, prediction log compaction, risk grid): "auto" runs them in
+# exactly one process, the first to take BACKGROUND_LEADER_LOCK (at startup under serve.py and python
+# app.py, on its first request under flask run or gunicorn app:app); "off" never runs them here
+BACKGROUND_SERVICES = os.getenv("BACKGROUND_SERVICES", "auto")
+BACKGROUND_LEADER_LOCK = os.getenv(
+    "BACKGROUND_LEADER_LOCK", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".background-leader.lock"))
+
+# Rendered /api/predict and / responses, refreshed in the background on `executor` once stale
+rendered_cache = RenderedResponseCache(executor)
+
+# Latest score of every location predicted so far, for /api/nearby
+scored_index = ScoredLocationIndex()
+
+# Every prediction with its features, partitioned by day, for /api/history
+prediction_log = PredictionLog()
 
 HTML_PAGE = """
 <!DOCTYPE html>
@@ -68,28 +111,61 @@ button:hover {{
 </html>
 """
 
+@app.before_request
+def _start_timer():
+    request.environ["aquascope.start"] = time.perf_counter()
+    ensure_background_services()
+
+
+@app.after_request
+def _observe_latency(response):
+    start = request.environ.get("aquascope.start")
+    if start is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - start,
+                             endpoint=request.endpoint or "unknown", status=str(response.status_code))
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/", methods=["GET"])
 def home():
     location = request.args.get("location")
     days = int(request.args.get("days", 90))
     if not location:
         return HTML_PAGE.format(result="")
-    try:
-        features = get_live_features(location, past_days=days)
+    budget = request_budget()
+
+    def render(generated_at):
+        features = coalesced_features(location, days, admit(budget))
         result = model.predict(features)
+        record_scores([(location, features, result)])
         html_result = f"""
-        <p><b>Location:</b> {location}</p>
+        <p><b>Location:</b> {html.escape(location)}</p>
         <p><b>Latitude:</b> {features['lat']}, <b>Longitude:</b> {features['lon']}</p>
         <p><b>Temperature:</b> {features['temp']} °C</p>
         <p><b>Humidity:</b> {features['humidity']} %</p>
         <p><b>Wind Speed:</b> {features['wind_speed']} m/s</p>
         <p><b>NDWI:</b> {features['ndwi']}, <b>NDTI:</b> {features['ndti']}</p>
         <p style='font-size:1.3em;'><b>{result['Risk Label']}</b> ({result['Water Contamination Risk Score (%)']}%)</p>
+        <p><small>Updated {time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(generated_at))}</small></p>
         """
-        return HTML_PAGE.format(result=html_result)
+        if features["stale_features"]:
+            html_result += f"<p><small>Not live right now: {', '.join(features['stale_features'])}</small></p>"
+        return HTML_PAGE.format(result=html_result), "text/html", not features["stale_features"]
+
+    try:
+        # Keyed by the exact spelling: the body echoes it, so differently punctuated queries can't share one
+        return cached_response(("home", location, days, budget is not None), render, budget)
+    except Overloaded:
+        return HTML_PAGE.format(result="<p style='color:red;'>Server is busy, please retry shortly.</p>"), 503, \
+            {"Retry-After": "1"}
     except Exception as e:
         traceback.print_exc()
-        return HTML_PAGE.format(result=f"<p style='color:red;'>Error: {e}</p>")
+        return HTML_PAGE.format(result=f"<p style='color:red;'>Error: {html.escape(str(e))}</p>")
 
 @app.route("/api/predict", methods=["GET"])
 def api_predict():
@@ -97,9 +173,12 @@ def api_predict():
     days = int(request.args.get("days", 90))
     if not location:
         return jsonify({"error": "Location required"}), 400
-    try:
-        features = get_live_features(location, past_days=days)
+    budget = request_budget()
+
+    def render(generated_at):
+        features = coalesced_features(location, days, admit(budget))
         prediction = model.predict(features)
+        record_scores([(location, features, prediction)])
         resp = {
             "Location": location,
             "Predicted Risk": f"{prediction['Risk Label']} ({prediction['Water Contamination Risk Score (%)']}%)",
@@ -110,13 +189,79 @@ def api_predict():
             "rainfall": features.get("precip", 0),
             "temperature": features.get("temp", 0),
             "visibility": features.get("visibility", 0),
-            "wind_speed": features.get("wind_speed", 0)
+            "wind_speed": features.get("wind_speed", 0),
+            "stale_features": features["stale_features"],
+            "source_status": features["source_status"],
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(generated_at))
         }
-        return jsonify(resp)
+        return app.json.dumps(resp), "application/json", not features["stale_features"]
+
+    try:
+        return cached_response(("predict", location, days, budget is not None), render, budget)
+    except Overloaded as e:
+        return overloaded(e)
+    except TimeoutError as e:
+        # Geocoding alone used up the latency budget
+        return jsonify({"error": str(e)}), 504, {"Retry-After": "1"}
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+
+def cached_response(key, render, budget=None):
+    """
+    Serve a rendered body from rendered_cache with an ETag (304 on If-None-Match),
+    its generation time, and how the cache answered (hit, stale or miss).
+    Callers without a latency budget are never handed a degraded (incomplete) render.
+    """
+    entry, result = rendered_cache.get(key, render, accept_incomplete=budget is not None)
+    response = Response(entry.body, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    response.headers["X-Generated-At"] = entry.generated_at_iso
+    response.headers["X-Cache"] = result.upper()
+    response.headers["Age"] = str(int(entry.age))
+    response.cache_control.max_age = max(0, int(rendered_cache.fresh - entry.age)) if entry.complete else 0
+    return response.make_conditional(request)
+
+
+# ---------------- LATENCY BUDGET & ADMISSION ---------------- #
+class Overloaded(Exception):
+    pass
+
+
+def request_budget():
+    """Latency budget in seconds from ?budget_ms= or the X-Latency-Budget-Ms header (None: no budget)."""
+    raw = request.args.get("budget_ms") or request.headers.get("X-Latency-Budget-Ms")
+    if not raw:
+        return None
+    try:
+        return max(0.05, float(raw) / 1000)
+    except ValueError:
+        abort(400, description="budget_ms must be a number of milliseconds")
+
+
+def admit(budget):
+    """
+    Admission control for work that needs live upstream data. Returns the budget to use:
+    unchanged when the pools keep up, capped at DEGRADED_BUDGET_MS when they are backing up.
+    Raises Overloaded when the backlog is past ADMISSION_SHED_DEPTH.
+    """
+    depth = queue_depth(executor, fetch_pool())
+    if depth >= ADMISSION_SHED_DEPTH:
+        ADMISSION_DECISIONS.inc(decision="shed")
+        raise Overloaded(f"{depth} tasks queued")
+    if depth >= ADMISSION_DEGRADE_DEPTH:
+        ADMISSION_DECISIONS.inc(decision="degrade")
+        degraded = DEGRADED_BUDGET_MS / 1000
+        return degraded if budget is None else min(budget, degraded)
+    ADMISSION_DECISIONS.inc(decision="admit")
+    return budget
+
+
+def overloaded(e):
+    print("⚠️ Shedding request:", e)
+    return jsonify({"error": "Server is overloaded, retry shortly"}), 503, {"Retry-After": "1"}
+
 @app.route("/api/batch_predict", methods=["GET"])
 def api_batch_predict():
     days = int(request.args.get("days", 90))
@@ -132,33 +277,430 @@ def api_batch_predict():
             return jsonify({"error": "locations (or location) query parameter required"}), 400
         locs = [x.strip() for x in l.split(",") if x.strip()]
 
+    try:
+        budget = admit(request_budget())
+    except Overloaded as e:
+        return overloaded(e)
+    # The budget covers the whole batch, so each location gets what is left of it when it starts
+    deadline = None if budget is None else time.monotonic() + budget
+
+    stream = request.args.get("stream")
+    if stream:
+        if stream not in ("ndjson", "sse"):
+            return jsonify({"error": "stream must be 'ndjson' or 'sse'"}), 400
+        return stream_batch(locs, days, stream, deadline)
+
+    # Fetch features once per distinct location in parallel threads,
+    # then score them all in one model call
+    unique = dedupe_locations(locs)
+    if len(unique) > 1 and deadline is None:
+        # Multi-location upstream requests first, so the per-location fetches below mostly hit the caches
+        prefetch_batch(list(unique.values()), days)
+    fetched = dict(zip(unique, executor.map(lambda key: fetch_location(unique[key], days, deadline), unique)))
+    ok = [key for key, (features, _) in fetched.items() if features is not None]
+    preds = dict(zip(ok, model.predict_batch([fetched[key][0] for key in ok])))
+    record_scores([(unique[key], fetched[key][0], preds[key]) for key in ok])
+
     results = []
+    for loc in locs:
+        key = location_key(loc)
+        features, error = fetched[key]
+        if features is None:
+            results.append({"Location": loc, "error": error})
+        else:
+            results.append(batch_record(loc, features, preds[key]))
+
+    return jsonify(results)
+
+
+def location_key(loc):
+    return normalize_name(loc)
+
+
+def dedupe_locations(locs):
+    """Distinct locations by normalized name -> first spelling seen, in request order."""
+    unique = {}
+    for loc in locs:
+        unique.setdefault(location_key(loc), loc)
+    return unique
+
+
+def stream_batch(locs, days, fmt, deadline=None):
+    """
+    Stream one result per location as soon as it completes (completion order, tagged with its index).
+    Without a budget, locations are prefetched in chunks of STREAM_PREFETCH_CHUNK like a plain batch;
+    each chunk's per-location fetches start once its prefetch is done, while the next chunk's runs.
+    """
+    indices = {}
+    for i, loc in enumerate(locs):
+        indices.setdefault(location_key(loc), []).append(i)
+    groups = list(indices.values())
+    if deadline is None and len(groups) > 1:
+        chunks = [groups[i:i + STREAM_PREFETCH_CHUNK] for i in range(0, len(groups), STREAM_PREFETCH_CHUNK)]
+    else:
+        chunks = []
+    futures = {}
+
+    def launch(chunk):
+        for idx in chunk:
+            futures[executor.submit(fetch_location, locs[idx[0]], days, deadline)] = idx
+
+    def prefetch(chunk):
+        return executor.submit(prefetch_batch, [locs[idx[0]] for idx in chunk], days)
+
+    warming = prefetch(chunks[0]) if chunks else None
+    if not chunks:
+        launch(groups)
+
+    def completed():
+        nonlocal warming
+        while futures or warming is not None:
+            done, _ = wait(list(futures) + ([warming] if warming is not None else []), return_when=FIRST_COMPLETED)
+            if warming in done:
+                launch(chunks.pop(0))
+                warming = prefetch(chunks[0]) if chunks else None
+            for fut in done:
+                if fut in futures:
+                    yield fut
+
+    def generate():
+        for fut in completed():
+            features, error = fut.result()
+            pred = model.predict(features) if features is not None else None
+            if pred is not None:
+                record_scores([(locs[futures[fut][0]], features, pred)])
+            for i in futures.pop(fut):
+                if features is None:
+                    record = {"index": i, "Location": locs[i], "error": error}
+                else:
+                    record = {"index": i, **batch_record(locs[i], features, pred)}
+                line = json.dumps(record, ensure_ascii=False)
+                yield f"data: {line}\n\n" if fmt == "sse" else line + "\n"
+        if fmt == "sse":
+            yield "event: done\ndata: {}\n\n"
+
+    mimetype = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return Response(generate(), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ---------------- NEARBY ---------------- #
+@app.route("/api/nearby", methods=["GET"])
+def api_nearby():
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+        radius = float(request.args.get("radius", 50))
+        k = int(request.args.get("k", 10))
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat and lon (plus optional radius in km and k) required"}), 400
+    sort = request.args.get("sort", "distance")
+    if sort not in ("distance", "risk"):
+        return jsonify({"error": "sort must be 'distance' or 'risk'"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius <= 0 or k <= 0:
+        return jsonify({"error": "lat/lon out of range, or non-positive radius or k"}), 400
+    return jsonify({
+        "lat": lat,
+        "lon": lon,
+        "radius_km": min(radius, MAX_NEARBY_RADIUS_KM),
+        "results": scored_index.nearby(lat, lon, radius, k=min(k, 1000), sort=sort),
+    })
+
+
+def record_scores(scored):
+    """Add (location, features, prediction) results to the nearby index and the prediction log; never fails the request."""
+    try:
+        scored_index.update([
+            (location_key(loc), loc, features["lat"], features["lon"],
+             pred["Water Contamination Risk Score (%)"], pred["Risk Label"])
+            for loc, features, pred in scored
+        ])
+    except Exception as e:
+        print(f"⚠️ Could not index scored locations: {e}")
+    try:
+        prediction_log.append([
+            (location_key(loc), loc, features, pred["Water Contamination Risk Score (%)"])
+            for loc, features, pred in scored
+        ])
+    except Exception as e:
+        print(f"⚠️ Could not log predictions: {e}")
 
-    def process_location(loc):
+
+# ---------------- HISTORY ---------------- #
+def history_window(default_days):
+    """(since, until) timestamps from ?since=/&until= (YYYY-MM-DD, UTC) or ?days= back from now."""
+    until = time.time()
+    if request.args.get("until"):
+        until = datetime.datetime.strptime(request.args["until"], "%Y-%m-%d").replace(
+            tzinfo=datetime.timezone.utc).timestamp() + 86400 - 1e-6
+    if request.args.get("since"):
+        since = datetime.datetime.strptime(request.args["since"], "%Y-%m-%d").replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+    else:
+        since = until - float(request.args.get("days", default_days)) * 86400
+    if since > until or until - since > PREDLOG_MAX_DAYS * 86400:
+        raise ValueError(f"window must be non-empty and at most {PREDLOG_MAX_DAYS} days")
+    return since, until
+
+
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    location = request.args.get("location", "").strip()
+    if not location:
+        return jsonify({"error": "location required"}), 400
+    try:
+        since, until = history_window(30)
+    except ValueError as e:
+        return jsonify({"error": f"bad since/until/days: {e}"}), 400
+    points = prediction_log.series(location_key(location), since, until,
+                                   with_features=request.args.get("features") == "1")
+    return jsonify({"Location": location, "count": len(points), "points": points})
+
+
+@app.route("/api/history/trend", methods=["GET"])
+def api_history_trend():
+    location = request.args.get("location", "").strip()
+    if not location:
+        return jsonify({"error": "location required"}), 400
+    try:
+        since, until = history_window(90)
+        window = int(request.args.get("window", 7))
+    except ValueError as e:
+        return jsonify({"error": f"bad since/until/days/window: {e}"}), 400
+    if window <= 0:
+        return jsonify({"error": "window must be positive"}), 400
+    return jsonify({
+        "Location": location,
+        "window_days": window,
+        "days": prediction_log.rolling(location_key(location), since, until, window_days=window),
+    })
+
+
+@app.route("/api/history/top", methods=["GET"])
+def api_history_top():
+    by = request.args.get("by", "mean")
+    if by not in ("mean", "max", "latest"):
+        return jsonify({"error": "by must be 'mean', 'max' or 'latest'"}), 400
+    try:
+        since, until = history_window(30)
+        k = int(request.args.get("k", 10))
+    except ValueError as e:
+        return jsonify({"error": f"bad since/until/days/k: {e}"}), 400
+    if k <= 0:
+        return jsonify({"error": "k must be positive"}), 400
+    return jsonify({"by": by, "results": prediction_log.top(since, until, k=min(k, 1000), by=by)})
+
+
+# ---------------- WATCHLIST ---------------- #
+@app.route("/api/watchlist", methods=["GET"])
+def api_watchlist():
+    return jsonify(watchlist.entries())
+
+
+@app.route("/api/watchlist", methods=["POST"])
+def api_watch():
+    body = request.get_json(silent=True) or {}
+    locs = [str(l).strip() for l in body.get("locations", []) if str(l).strip()]
+    days = int(body.get("days", 90))
+    if not locs:
+        return jsonify({"error": "JSON body with a non-empty 'locations' list required"}), 400
+    added, errors = [], []
+    for loc in locs:
         try:
-            features = get_live_features(loc, past_days=days)
-            pred = model.predict(features)
-            return {
-                "Location": loc,
-                "Predicted Risk": f"{pred['Risk Label']} ({pred['Water Contamination Risk Score (%)']}%)",
-                "aqi": int(features.get("aqi", 0)),
-                "clouds": float(features.get("clouds", 0)),
-                "humidity": float(features.get("humidity", 0)),
-                "pressure": float(features.get("pressure", 0)),
-                "rainfall": float(features.get("precip", 0)),
-                "temperature": float(features.get("temp", 0)),
-                "visibility": int(features.get("visibility", 0)),
-                "wind_speed": float(features.get("wind_speed", 0))
-            }
+            added.append(watchlist.add(loc, days))
         except Exception as e:
-            return {"Location": loc, "error": str(e)}
+            errors.append({"Location": loc, "error": str(e)})
+    return jsonify({"added": added, "errors": errors}), 201 if added else 400
 
-    # Run predictions in parallel threads safely
-    futures = [executor.submit(process_location, loc) for loc in locs]
-    for f in futures:
-        results.append(f.result())
 
-    return jsonify(results)
+@app.route("/api/watchlist/<path:location>", methods=["DELETE"])
+def api_unwatch(location):
+    if not watchlist.remove(location):
+        return jsonify({"error": "Location is not on the watchlist"}), 404
+    return jsonify({"removed": location})
+
+
+@app.route("/api/alerts", methods=["GET"])
+def api_alerts():
+    limit = min(int(request.args.get("limit", 100)), 1000)
+    return jsonify(watchlist.sink.latest(limit))
+
+
+# ---------------- BATCH JOBS ---------------- #
+@app.route("/api/jobs", methods=["POST"])
+def api_submit_job():
+    body = request.get_json(silent=True) or {}
+    locs = [str(l).strip() for l in body.get("locations", []) if str(l).strip()]
+    days = int(body.get("days", 90))
+    if not locs:
+        return jsonify({"error": "JSON body with a non-empty 'locations' list required"}), 400
+    if len(locs) > MAX_JOB_LOCATIONS:
+        return jsonify({"error": f"At most {MAX_JOB_LOCATIONS} locations per job"}), 400
+    job_id = job_scheduler.submit(locs, days)
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "results_url": f"/api/jobs/{job_id}/results",
+    }), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/results", methods=["GET"])
+def api_job_results(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    offset = int(request.args.get("offset", 0))
+    limit = min(int(request.args.get("limit", 100)), 1000)
+    results = job_store.results(job_id, offset=offset, limit=limit)
+    # Resume point for the next poll: the first index that hasn't finished yet
+    next_offset = offset
+    for r in results:
+        if r["index"] != next_offset:
+            break
+        next_offset += 1
+    return jsonify({"job_id": job_id, "status": job["status"], "results": results, "next_offset": next_offset})
+
+
+# ---------------- RISK GRID ---------------- #
+@app.route("/api/risk_grid", methods=["GET"])
+def api_risk_grid():
+    bbox = request.args.get("bbox")
+    try:
+        lat_min, lon_min, lat_max, lon_max = [float(v) for v in bbox.split(",")]
+    except (AttributeError, ValueError):
+        return jsonify({"error": "bbox=lat_min,lon_min,lat_max,lon_max required"}), 400
+    return risk_grid_response(lat_min, lon_min, lat_max, lon_max)
+
+
+@app.route("/api/risk_grid/tile/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def api_risk_tile(z, x, y):
+    return risk_grid_response(*tile_bbox(z, x, y))
+
+
+def risk_grid_response(lat_min, lon_min, lat_max, lon_max):
+    result = risk_grid.query_bbox(lat_min, lon_min, lat_max, lon_max)
+    if result is None:
+        return jsonify({"error": "Risk grid has not been computed yet"}), 404
+    return jsonify(result)
+
+
+def predict_location(loc, days):
+    features, error = fetch_location(loc, days)
+    if features is None:
+        return {"Location": loc, "error": error}
+    pred = model.predict(features)
+    record_scores([(loc, features, pred)])
+    return batch_record(loc, features, pred)
+
+
+def fetch_location(loc, days, deadline=None):
+    """(features, None) or (None, error message); deadline is an absolute time.monotonic() value."""
+    budget = None if deadline is None else max(0.0, deadline - time.monotonic())
+    try:
+        return coalesced_features(loc, days, budget), None
+    except Exception as e:
+        return None, str(e)
+
+
+# Concurrent requests for the same (location, days) share one get_live_features run. Budgeted and
+# unbudgeted calls never share: an unbudgeted caller must not receive a leader's degraded result.
+live_features_flight = SingleFlight("live_features")
+
+
+def coalesced_features(loc, days, budget=None):
+    """
+    A budgeted follower waits for the shared run only as long as its own budget; if the leader is
+    still going, it builds its own result from cached / last known values instead.
+    """
+    try:
+        features = live_features_flight.do((location_key(loc), days, budget is not None),
+                                           lambda: get_live_features(loc, past_days=days, budget=budget),
+                                           timeout=budget)
+    except TimeoutError:
+        if budget is None:
+            raise
+        features = get_live_features(loc, past_days=days, budget=0.0)
+    return dict(features)
+
+
+def batch_record(loc, features, pred):
+    return {
+        "Location": loc,
+        "Predicted Risk": f"{pred['Risk Label']} ({pred['Water Contamination Risk Score (%)']}%)",
+        "aqi": int(features.get("aqi", 0)),
+        "clouds": float(features.get("clouds", 0)),
+        "humidity": float(features.get("humidity", 0)),
+        "pressure": float(features.get("pressure", 0)),
+        "rainfall": float(features.get("precip", 0)),
+        "temperature": float(features.get("temp", 0)),
+        "visibility": int(features.get("visibility", 0)),
+        "wind_speed": float(features.get("wind_speed", 0)),
+        "stale_features": features.get("stale_features", [])
+    }
+
+job_store = JobStore()
+job_scheduler = JobScheduler(job_store, predict_location)
+
+watch_executor("requests", executor)
+watch_executor("fetch", fetch_pool())
+watch_executor("jobs", job_scheduler.executor)
+
+watchlist = Watchlist(model)
+risk_grid = RiskGridReader()
+
+
+def start_background_services():
+    """
+    Resume unfinished jobs and start the watchlist, prediction log compaction, response cache purge
+    and risk grid loops.
+    """
+    job_scheduler.resume()
+    start_cache_purge_loop()
+    watchlist.start()
+    prediction_log.start_compactor()
+    if os.getenv("RISK_GRID_REFRESH_HOURS"):
+        start_risk_grid_scheduler(model, float(os.getenv("RISK_GRID_REFRESH_HOURS")))
+
+
+_background = {"decided": False, "leader": False, "lock_file": None}
+_background_lock = threading.Lock()
+
+
+def ensure_background_services():
+    """
+    Once per process: take BACKGROUND_LEADER_LOCK without blocking and, if this process got it,
+    start the background services. The lock is held for the life of the process, so exactly one
+    process of a deployment runs them. True if they run here.
+    """
+    if _background["decided"]:
+        return _background["leader"]
+    with _background_lock:
+        if not _background["decided"]:
+            if BACKGROUND_SERVICES == "auto":
+                f = open(BACKGROUND_LEADER_LOCK, "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    _background["lock_file"] = f
+                    _background["leader"] = True
+                except OSError:
+                    f.close()
+            if _background["leader"]:
+                print(f"Process {os.getpid()} runs the background services")
+                start_background_services()
+            _background["decided"] = True
+    return _background["leader"]
+
 
 if __name__ == "__main__":
+    # With the debug reloader only the child process that actually serves runs the background loops
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        ensure_background_services()
     app.run(debug=True, host="0.0.0.0", port=5000, threaded=True)
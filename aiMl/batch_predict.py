@@ -46,14 +46,22 @@ water_bodies = [
 # Send them as multiple query params (not a single comma-separated string)
 params = [("locations", wb) for wb in water_bodies]
 params.append(("days", 90))
+params.append(("stream", "ndjson"))
 
-response = requests.get(BASE_URL, params=params)
+# Results arrive one per line as each location finishes
+response = requests.get(BASE_URL, params=params, stream=True)
 
 try:
-    data = response.json()
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    response.raise_for_status()
+    data = [None] * len(water_bodies)
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        result = json.loads(line)
+        data[result.pop("index")] = result
+        print(json.dumps(result, ensure_ascii=False))
 
-    # save output to JSON file
+    # save output to JSON file (in the original request order)
     with open("batch_results.json", "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
     print("\n✅ Results saved to batch_results.json")
@@ -0,0 +1,175 @@
+# benchmark.py
+"""
+Offline benchmark for the prediction pipeline.
+
+Starts the replay stub (replay.py), points every provider at it and reports
+p50/p95/p99 latency and throughput per stage and for /api/predict and
+/api/batch_predict. Needs no network access.
+
+    python benchmark.py --latency "*=0.05,nasa_power=0.4" --iterations 30 --batch-sizes 1,10,50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from replay import ReplayServer, parse_latency
+
+_names = itertools.count()
+
+
+def fresh_locations(n):
+    """Place names never seen before, so geocoding and provider caches start cold."""
+    return [f"Bench Lake {next(_names)}, India" for _ in range(n)]
+
+
+def summarize(name, latencies, wall, units):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "stage": name,
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "throughput_per_s": round(units / wall, 2) if wall else None,
+    }
+
+
+def timed_runs(fn, inputs, concurrency=1):
+    latencies = []
+
+    def run(arg):
+        t = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, inputs))
+    return latencies, time.perf_counter() - start
+
+
+def run_benchmarks(args, reset_caches):
+    import main
+    import app
+
+    warm = args.warm
+    rows = []
+
+    def prepare(n):
+        if not warm:
+            reset_caches()
+        return fresh_locations(n) if not warm else ["Bench Lake warm, India"] * n
+
+    # ---- per-stage ----
+    locs = prepare(args.iterations)
+    lat, wall = timed_runs(main.get_coordinates, locs)
+    rows.append(summarize("geocode", lat, wall, len(locs)))
+    coords = [main.get_coordinates(loc) for loc in locs]
+
+    for name, fetch in [("openweather", main.get_openweather_current),
+                        ("openmeteo", lambda la, lo: main.get_openmeteo_historical(la, lo, 90)),
+                        ("copernicus", main.get_copernicus_marine),
+                        ("nasa_power", main.get_nasa_power)]:
+        if not warm:
+            reset_caches()
+        lat, wall = timed_runs(lambda c: fetch(*c), coords)
+        rows.append(summarize(name, lat, wall, len(coords)))
+
+    features = [main.features_for_coordinates(*c) for c in coords]
+    engine = app.model.engine
+    for name in ("sklearn", "flat"):
+        app.model.engine = name
+        lat, wall = timed_runs(app.model.predict, features)
+        rows.append(summarize(f"inference[{name}]", lat, wall, len(features)))
+    app.model.engine = engine
+
+    locs = prepare(args.iterations)
+    lat, wall = timed_runs(main.get_live_features, locs)
+    rows.append(summarize("get_live_features", lat, wall, len(locs)))
+
+    # ---- endpoints ----
+    client = app.app.test_client()
+
+    def check(resp):
+        if resp.status_code != 200:
+            raise RuntimeError(f"{resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+
+    locs = prepare(args.iterations)
+    lat, wall = timed_runs(lambda loc: check(client.get("/api/predict", query_string={"location": loc})),
+                           locs, concurrency=args.concurrency)
+    rows.append(summarize("/api/predict", lat, wall, len(locs)))
+
+    for size in args.batch_sizes:
+        batches = [prepare(size) for _ in range(max(1, args.iterations // size))]
+        lat, wall = timed_runs(
+            lambda b: check(client.get("/api/batch_predict", query_string=[("locations", l) for l in b])),
+            batches, concurrency=args.concurrency
+        )
+        rows.append(summarize(f"/api/batch_predict[{size}]", lat, wall, size * len(batches)))
+    return rows
+
+
+def print_table(rows):
+    cols = ["stage", "n", "p50_ms", "p95_ms", "p99_ms", "throughput_per_s"]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", default="*=0.02", help="injected upstream latency, see replay.parse_latency")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--batch-sizes", default="1,10,30")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent clients for endpoint runs")
+    parser.add_argument("--warm", action="store_true", help="keep caches between calls (measures the hit path)")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the per-provider token buckets on")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    args.batch_sizes = [int(x) for x in args.batch_sizes.split(",") if x]
+
+    server = ReplayServer(latency=parse_latency(args.latency), jitter=args.jitter).start()
+    workdir = tempfile.mkdtemp(prefix="aquascope-bench-")
+    # Must be set before the app modules are imported: they read their config at import time
+    os.environ.update({
+        "UPSTREAM_OVERRIDE_URL": server.url,
+        "PROVIDER_RATE_LIMITS": "1" if args.rate_limits else "0",
+        "GAZETTEER_PATH": "",
+        "RESPONSE_CACHE_DB": "",
+        "GEOCODE_DB": os.path.join(workdir, "geocode.db"),
+        "WEATHER_HISTORY_DB": os.path.join(workdir, "weather_history.db"),
+        "JOBS_DB": os.path.join(workdir, "jobs.db"),
+        "TILE_CACHE_DIR": os.path.join(workdir, "tiles"),
+        "SPATIAL_DB": os.path.join(workdir, "scored_locations.db"),
+        "WATCHLIST_DB": os.path.join(workdir, "watchlist.db"),
+        "WATCH_ALERTS_PATH": os.path.join(workdir, "alerts.jsonl"),
+        "PREDLOG_DIR": os.path.join(workdir, "prediction_log"),
+        "BACKGROUND_SERVICES": "off",
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from cache import response_cache
+    from geocache import geocode_cache
+
+    def reset_caches():
+        response_cache.clear()
+        geocode_cache.clear()
+
+    rows = run_benchmarks(args, reset_caches)
+    print(f"\nUpstream latency {args.latency} (jitter {args.jitter}s), "
+          f"{'warm' if args.warm else 'cold'} caches, upstream requests: {server.requests}\n")
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
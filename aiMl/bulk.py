@@ -0,0 +1,129 @@
+# bulk.py
+"""
+Offline bulk scoring without the Flask server.
+
+Reads one location per line from a file (or stdin), fetches features and scores them
+in-process with a thread pool, and appends one JSON line per location to the output
+as soon as it finishes. The output file doubles as the checkpoint: rerunning the same
+command skips locations that already have a successful result in it.
+
+    python bulk.py locations.txt -o results.jsonl --workers 16
+    cat locations.txt | python bulk.py - -o results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from main import get_live_features
+from model import load_or_train
+from geocache import normalize_name
+
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "8"))
+
+
+def read_locations(path):
+    """Non-empty, non-comment lines from a file or '-' for stdin."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def load_checkpoint(path, days):
+    """
+    Normalized names already scored for `days` in an existing output file.
+    A partial last line left by an interrupted run is cut off so appends start on a clean line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good_end = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            good_end += len(raw)
+            if "error" not in record and record.get("days") == days:
+                done.add(normalize_name(record["Location"]))
+    if good_end < os.path.getsize(path):
+        print(f"⚠️ Dropping a partial record at the end of {path}")
+        with open(path, "r+b") as f:
+            f.truncate(good_end)
+    return done
+
+
+def score_location(model, loc, days):
+    try:
+        features = get_live_features(loc, past_days=days)
+    except Exception as e:
+        return {"Location": loc, "days": days, "error": str(e)}
+    return {"Location": loc, "days": days, **model.predict(features), "features": features}
+
+
+def run(locations, output, days=90, workers=BULK_WORKERS, model=None):
+    """Score every location not already in `output`, appending results as they complete."""
+    model = model or load_or_train()
+    done = load_checkpoint(output, days)
+    todo, seen = [], set(done)
+    for loc in locations:
+        key = normalize_name(loc)
+        if key not in seen:
+            seen.add(key)
+            todo.append(loc)
+    print(f"{len(todo)} to score, {len(done)} already in {output}")
+
+    start = time.perf_counter()
+    ok = failed = 0
+    pending = iter(todo)
+    in_flight = set()
+    # Keep only a few tasks per worker queued so Ctrl-C stops promptly on large inputs
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(output, "a", encoding="utf-8") as out:
+        try:
+            while True:
+                for loc in pending:
+                    in_flight.add(pool.submit(score_location, model, loc, days))
+                    if len(in_flight) >= workers * 4:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    record = fut.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if "error" in record:
+                        failed += 1
+                        print(f"❌ {record['Location']}: {record['error']}")
+                    else:
+                        ok += 1
+                out.flush()
+        except KeyboardInterrupt:
+            for fut in in_flight:
+                fut.cancel()
+            print("\n⚠️ Interrupted, rerun the same command to resume")
+            raise
+    elapsed = time.perf_counter() - start
+    print(f"✅ {ok} scored, {failed} failed in {elapsed:.1f}s")
+    return ok, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score many locations in-process and stream results to JSONL.")
+    parser.add_argument("input", nargs="?", default="-", help="file with one location per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="bulk_results.jsonl")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    args = parser.parse_args()
+
+    try:
+        _, failed = run(read_locations(args.input), args.output, args.days, args.workers)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,214 @@
+# cache.py
+import os
+import json
+import math
+import time
+import sqlite3
+import datetime
+import threading
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+# Max number of provider responses kept in memory
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+# Optional SQLite file that keeps cached responses across restarts ("" disables it)
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+# How long the last good response per provider cell is kept as a fallback for failed or late fetches
+LAST_KNOWN_TTL = int(os.getenv("LAST_KNOWN_TTL", str(7 * 24 * 3600)))
+# How often expired rows are deleted from RESPONSE_CACHE_DB (by the background-services process)
+RESPONSE_CACHE_PURGE_SECONDS = float(os.getenv("RESPONSE_CACHE_PURGE_SECONDS", "3600"))
+
+# Per-provider TTL (seconds) and native grid resolution (lat step, lon step in degrees).
+# Coordinates inside the same grid cell share one cached response.
+PROVIDER_CACHE = {
+    "openweather": {"ttl": 10 * 60, "grid": (0.01, 0.01)},
+    "openmeteo": {"ttl": 6 * 3600, "grid": (0.1, 0.1)},
+    "copernicus": {"ttl": 3600, "grid": (1 / 12, 1 / 12)},
+    "nasa_power": {"ttl": 6 * 3600, "grid": (0.5, 0.625)},
+}
+
+
+def grid_cell(provider, lat, lon):
+    """Snap a coordinate to the provider's native grid cell index."""
+    dlat, dlon = PROVIDER_CACHE[provider]["grid"]
+    return math.floor(lat / dlat), math.floor(lon / dlon)
+
+
+class DiskStore:
+    """SQLite backing store for TTLCache, values are stored as JSON."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Delete expired rows; returns how many were removed."""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+
+class TTLCache:
+    """Memory-bounded LRU cache with per-entry expiry and an optional DiskStore behind it."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    return value
+                del self._data[key]
+        if self.store is None:
+            return None
+        entry = self.store.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        with self._lock:
+            self._insert(key, entry[0], entry[1])
+        return entry[0]
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._insert(key, value, expires_at)
+        if self.store is not None:
+            self.store.set(key, value, expires_at)
+
+    def _insert(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+response_cache = TTLCache(store=DiskStore(RESPONSE_CACHE_DB) if RESPONSE_CACHE_DB else None)
+# Last successful value per (provider, cell), kept well past its TTL for degraded-mode serving
+last_known = TTLCache(store=response_cache.store)
+
+
+def start_purge_loop(interval=RESPONSE_CACHE_PURGE_SECONDS):
+    """Purge expired rows from the on-disk store every interval seconds on a daemon thread (no-op without one)."""
+    store = response_cache.store
+    if store is None:
+        return None
+
+    def loop():
+        while True:
+            try:
+                store.purge_expired()
+            except Exception as e:
+                print("⚠️ Response cache purge failed:", e)
+            time.sleep(interval)
+
+    t = threading.Thread(target=loop, name="cache-purge", daemon=True)
+    t.start()
+    return t
+
+
+def cache_key(provider, lat, lon, window):
+    cell = grid_cell(provider, lat, lon)
+    return json.dumps([provider, cell[0], cell[1], window])
+
+
+def last_known_key(provider, lat, lon, window):
+    # The date part of the window is dropped: yesterday's value is still the best fallback today
+    variant = window.split("/", 1)[1] if window and "/" in window else None
+    cell = grid_cell(provider, lat, lon)
+    return json.dumps(["last_known", provider, cell[0], cell[1], variant])
+
+
+def distinct_cells(provider, coords):
+    """One representative coordinate per provider grid cell, in first-seen order."""
+    cells = {}
+    for lat, lon in coords:
+        cells.setdefault(grid_cell(provider, lat, lon), (lat, lon))
+    return list(cells.values())
+
+
+def cached_call(provider, lat, lon, window, fetch):
+    """
+    Return the cached response for (provider, grid cell, date window), calling fetch() on a miss.
+    fetch() should raise on failure so fallback values never end up in the cache.
+    """
+    key = cache_key(provider, lat, lon, window)
+    value = response_cache.get(key)
+    CACHE_REQUESTS.inc(cache=provider, result="miss" if value is None else "hit")
+    if value is None:
+        value = fetch()
+        response_cache.set(key, value, PROVIDER_CACHE[provider]["ttl"])
+        last_known.set(last_known_key(provider, lat, lon, window), value, LAST_KNOWN_TTL)
+    return dict(value)
+
+
+def cache_lookup(provider, lat, lon, window):
+    """Cached value without counting a lookup, for warming code that only needs to know what is missing."""
+    return response_cache.get(cache_key(provider, lat, lon, window))
+
+
+def cache_put(provider, lat, lon, window, value):
+    """Store a value fetched outside cached_call (e.g. by a multi-location request)."""
+    response_cache.set(cache_key(provider, lat, lon, window), value, PROVIDER_CACHE[provider]["ttl"])
+    last_known.set(last_known_key(provider, lat, lon, window), value, LAST_KNOWN_TTL)
+
+
+def last_known_value(provider, lat, lon, window):
+    """Most recent successful value for the provider's grid cell, even if expired, or None."""
+    value = last_known.get(last_known_key(provider, lat, lon, window))
+    CACHE_REQUESTS.inc(cache="last_known", result="miss" if value is None else "hit")
+    return None if value is None else dict(value)
+
+
+def today_window(days=None):
+    """Date window component of a cache key: today's date, plus the look-back length if any."""
+    today = datetime.date.today().isoformat()
+    return today if days is None else f"{today}/{days}"
@@ -0,0 +1,147 @@
+# flatforest.py
+"""
+Flat-array evaluator for a fitted RandomForestRegressor.
+
+All trees are exported into one set of contiguous node arrays and a batch is
+walked through every tree at once, one depth level per numpy step. Results
+match sklearn bit for bit (same float32 input cast, same comparison, same
+tree summation order); test_flatforest.py checks this and `python flatforest.py` times both.
+
+save() writes the arrays as plain .npy files; load(mmap_mode="r") maps them read-only,
+so every process scoring with the same artifact shares one copy in the page cache.
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, value, roots, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Concatenate the trees of a fitted single-output forest into flat node arrays."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, depth = 0, 0
+        for est in forest.estimators_:
+            t = est.tree_
+            n = t.node_count
+            idx = np.arange(n)
+            is_leaf = t.children_left == -1
+            # Leaves point at themselves so extra traversal steps are no-ops
+            lefts.append(np.where(is_leaf, idx, t.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, t.children_right) + offset)
+            features.append(np.where(is_leaf, 0, t.feature))
+            thresholds.append(np.asarray(t.threshold, dtype=np.float64))
+            values.append(np.asarray(t.value, dtype=np.float64).reshape(n, -1)[:, 0])
+            roots.append(offset)
+            offset += n
+            depth = max(depth, t.max_depth)
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=depth,
+        )
+
+    def save(self, path):
+        """Write one .npy per node array (plus depth) into directory `path`, atomically."""
+        tmp = path + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(tmp, "depth.npy"), np.asarray(self.depth))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(depth=int(np.load(os.path.join(path, "depth.npy"))), **arrays)
+
+    def predict(self, X):
+        """Mean prediction over all trees for an (n, n_features) array."""
+        # sklearn evaluates trees on float32 inputs
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if len(X) == 1:
+            return self._predict_row(X[0])
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self._average(self.value[nodes])
+
+    def _predict_row(self, x):
+        nodes = self.roots
+        for _ in range(self.depth):
+            go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self._average(self.value[nodes][None, :])
+
+    def _average(self, per_tree):
+        # Accumulate trees left to right like sklearn's `out += tree.predict(X)` so results are identical
+        return np.cumsum(per_tree, axis=1)[:, -1] / self.n_trees
+
+
+def check_parity(forest, flat, X):
+    """Max absolute difference between sklearn and the flat evaluator (0.0 when identical)."""
+    expected = forest.predict(X)
+    got = flat.predict(X)
+    singles = np.array([flat.predict(row)[0] for row in X[:50]])
+    return max(float(np.max(np.abs(expected - got))), float(np.max(np.abs(expected[:50] - singles))))
+
+
+def _time_per_call(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    from model import AquaScopeModel
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark for FlatForest against sklearn.")
+    parser.add_argument("--rows", type=int, default=2000, help="rows for the parity check")
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    # Train in memory so running the benchmark never writes a model artifact
+    model = AquaScopeModel()
+    model.train_dummy()
+    forest = model.model
+    flat = FlatForest.from_sklearn(forest)
+
+    rng = np.random.RandomState(0)
+    X = rng.uniform(-50, 350, size=(args.rows, forest.n_features_in_))
+    # Rows that sit exactly on split thresholds exercise the <= tie handling
+    n_ties = min(args.rows // 4, len(flat.threshold))
+    picks = rng.choice(len(flat.threshold), n_ties, replace=False)
+    X[np.arange(n_ties), flat.feature[picks]] = flat.threshold[picks].astype(np.float32)
+    diff = check_parity(forest, flat, X)
+    print(f"Parity over {args.rows} rows: max |sklearn - flat| = {diff}")
+
+    print(f"{'rows':>6} {'sklearn_us':>12} {'flat_us':>10} {'speedup':>8}")
+    for n in (1, 10, 100):
+        batch = X[:n]
+        sk = _time_per_call(lambda: forest.predict(batch), args.repeat) * 1e6
+        fl = _time_per_call(lambda: flat.predict(batch), args.repeat) * 1e6
+        print(f"{n:>6} {sk:>12.1f} {fl:>10.1f} {sk / fl:>7.1f}x")
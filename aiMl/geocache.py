@@ -0,0 +1,133 @@
+# geocache.py
+import os
+import re
+import csv
+import time
+import bisect
+import sqlite3
+import threading
+from collections import OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GEOCODE_DB = os.getenv("GEOCODE_DB", os.path.join(BASE_DIR, "geocode_cache.db"))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "4096"))
+# Optional offline gazetteer (CSV with name,lat,lon columns); set to "" to disable
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(BASE_DIR, "gazetteer.csv"))
+# A prefix query must be at least this many whole words ('upper lake' -> 'upper lake bhopal', not 'upper')
+GAZETTEER_MIN_PREFIX_WORDS = int(os.getenv("GAZETTEER_MIN_PREFIX_WORDS", "2"))
+
+
+def normalize_name(name: str):
+    """Normalize a place name so 'Marina Beach, Chennai' and 'marina  beach chennai' share a key."""
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+
+# ---------------- PERSISTENT CACHE ---------------- #
+class GeocodeCache:
+    """Normalized name -> (lat, lon) cache: in-process LRU in front of a SQLite table."""
+
+    def __init__(self, db_path=GEOCODE_DB, max_size=GEOCODE_LRU_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode (
+                    name TEXT PRIMARY KEY,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    source TEXT,
+                    updated_at REAL
+                )
+            """)
+            self._conn.commit()
+
+    def _remember(self, key, coords):
+        self._lru[key] = coords
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def get(self, name):
+        key = normalize_name(name)
+        with self._lock:
+            coords = self._lru.get(key)
+            if coords is not None:
+                self._lru.move_to_end(key)
+                return coords
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT lat, lon FROM geocode WHERE name = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            coords = (row[0], row[1])
+            self._remember(key, coords)
+            return coords
+
+    def put(self, name, lat, lon, source=None):
+        key = normalize_name(name)
+        with self._lock:
+            self._remember(key, (lat, lon))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocode (name, lat, lon, source, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, lat, lon, source, time.time())
+                )
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM geocode")
+                self._conn.commit()
+
+
+# ---------------- OFFLINE GAZETTEER ---------------- #
+class Gazetteer:
+    """Known place names held in a sorted index so lookups can match by name prefix."""
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self._entries[normalize_name(row["name"])] = (float(row["lat"]), float(row["lon"]))
+        self._keys = sorted(self._entries)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def match(self, name):
+        """
+        (entry name, coords) for an exact match, otherwise for the single entry whose leading
+        words are the query (at least GAZETTEER_MIN_PREFIX_WORDS whole words); else None.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key in self._entries:
+            return key, self._entries[key]
+        if len(key.split()) < GAZETTEER_MIN_PREFIX_WORDS:
+            return None
+        prefix = key + " "
+        i = bisect.bisect_left(self._keys, prefix)
+        matches = []
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            matches.append(self._keys[i])
+            if len(matches) > 1:
+                return None  # ambiguous prefix, let the geocoder decide
+            i += 1
+        return (matches[0], self._entries[matches[0]]) if matches else None
+
+    def lookup(self, name):
+        found = self.match(name)
+        return found[1] if found else None
+
+
+geocode_cache = GeocodeCache()
+gazetteer = Gazetteer()
@@ -0,0 +1,159 @@
+# history.py
+import os
+import sqlite3
+import datetime
+import threading
+from collections import defaultdict
+from cache import PROVIDER_CACHE, grid_cell
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WEATHER_HISTORY_DB = os.getenv("WEATHER_HISTORY_DB", os.path.join(BASE_DIR, "weather_history.db"))
+# Aggregates refuse a window whose first stored day is more than this many days after its start...
+HISTORY_START_SLACK_DAYS = int(os.getenv("HISTORY_START_SLACK_DAYS", "3"))
+# ...or whose stored days cover less than this fraction of the span between first and last stored day
+HISTORY_MIN_COVERAGE = float(os.getenv("HISTORY_MIN_COVERAGE", "0.9"))
+
+# Open-Meteo daily variable -> weather_data column
+DAILY_COLUMNS = {
+    "temperature_2m_mean": "temperature",
+    "relative_humidity_2m_mean": "humidity",
+    "pressure_msl_mean": "pressure",
+    "windspeed_10m_max": "wind_speed",
+    "cloud_cover_mean": "clouds",
+    "precipitation_sum": "precipitation",
+}
+
+
+def location_key(lat, lon):
+    """History is stored per Open-Meteo grid cell, identified by the cell centre ('lat,lon')."""
+    dlat, dlon = PROVIDER_CACHE["openmeteo"]["grid"]
+    i, j = grid_cell("openmeteo", lat, lon)
+    return f"{(i + 0.5) * dlat:.3f},{(j + 0.5) * dlon:.3f}"
+
+
+def key_coordinates(key):
+    lat, lon = key.split(",")
+    return float(lat), float(lon)
+
+
+class WeatherHistory:
+    """Daily observations per location in the weather_data table, ingested incrementally."""
+
+    def __init__(self, db_path=WEATHER_HISTORY_DB):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._key_locks = defaultdict(threading.Lock)
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_data (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    location TEXT,
+                    date TEXT,
+                    temperature REAL,
+                    humidity REAL,
+                    pressure REAL,
+                    wind_speed REAL,
+                    clouds REAL,
+                    aqi REAL
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(weather_data)")}
+            if "precipitation" not in columns:
+                self._conn.execute("ALTER TABLE weather_data ADD COLUMN precipitation REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_weather_data_location_date ON weather_data (location, date)"
+            )
+            self._conn.commit()
+
+    def key_lock(self, key):
+        """Serializes ingestion per location so concurrent requests don't insert the same days twice."""
+        with self._lock:
+            return self._key_locks[key]
+
+    def stored_dates(self, key, start, end):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT date FROM weather_data WHERE location = ? AND date BETWEEN ? AND ?",
+                (key, start.isoformat(), end.isoformat())
+            ).fetchall()
+        return {datetime.date.fromisoformat(r[0]) for r in rows}
+
+    def missing_ranges(self, key, start, end):
+        """(first, last) runs of days in [start, end] that are not stored yet, oldest first."""
+        stored = self.stored_dates(key, start, end)
+        ranges, run_start = [], None
+        day = start
+        while day <= end:
+            if day in stored:
+                if run_start is not None:
+                    ranges.append((run_start, day - datetime.timedelta(days=1)))
+                    run_start = None
+            elif run_start is None:
+                run_start = day
+            day += datetime.timedelta(days=1)
+        if run_start is not None:
+            ranges.append((run_start, end))
+        return ranges
+
+    def ingest(self, key, daily):
+        """Store an Open-Meteo 'daily' block; days without a mean temperature (not published yet) are skipped."""
+        dates = daily.get("time", [])
+        rows = []
+        for i, day in enumerate(dates):
+            values = {col: (daily.get(var) or [None] * len(dates))[i] for var, col in DAILY_COLUMNS.items()}
+            if values["temperature"] is None:
+                continue
+            rows.append((key, day, values["temperature"], values["humidity"], values["pressure"],
+                         values["wind_speed"], values["clouds"], values["precipitation"]))
+        if not rows:
+            return 0
+        with self._lock:
+            existing = {r[0] for r in self._conn.execute(
+                "SELECT date FROM weather_data WHERE location = ? AND date BETWEEN ? AND ?",
+                (key, rows[0][1], rows[-1][1])
+            )}
+            rows = [r for r in rows if r[1] not in existing]
+            self._conn.executemany(
+                "INSERT INTO weather_data (location, date, temperature, humidity, pressure, wind_speed, clouds, precipitation) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def aggregates(self, key, start, end):
+        """
+        hist_* features computed from the stored days in [start, end]. Raises LookupError when the
+        stored days don't cover the window, so callers fall back instead of using a truncated one.
+        """
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT COUNT(*), AVG(temperature), SUM(precipitation), AVG(wind_speed),
+                       MIN(date), MAX(date),
+                       (SELECT temperature FROM weather_data
+                        WHERE location = ?1 AND date BETWEEN ?2 AND ?3 ORDER BY date LIMIT 1),
+                       (SELECT temperature FROM weather_data
+                        WHERE location = ?1 AND date BETWEEN ?2 AND ?3 ORDER BY date DESC LIMIT 1)
+                FROM weather_data
+                WHERE location = ?1 AND date BETWEEN ?2 AND ?3
+            """, (key, start.isoformat(), end.isoformat())).fetchone()
+        count, mean_temp, sum_precip, mean_wind, first_day, last_day, first_temp, last_temp = row
+        if not count:
+            raise LookupError(f"No stored weather history for {key} between {start} and {end}")
+        first_day, last_day = datetime.date.fromisoformat(first_day), datetime.date.fromisoformat(last_day)
+        if (first_day - start).days > HISTORY_START_SLACK_DAYS:
+            raise LookupError(f"Weather history for {key} starts at {first_day}, window starts at {start}")
+        if count < HISTORY_MIN_COVERAGE * ((last_day - first_day).days + 1):
+            raise LookupError(f"Weather history for {key} has only {count} days between {first_day} and {last_day}")
+        return {
+            "hist_mean_temp": round(mean_temp or 0, 2),
+            "hist_sum_precip": round(sum_precip or 0, 3),
+            "hist_mean_wind": round(mean_wind or 0, 2),
+            "hist_temp_trend": round(last_temp - first_temp, 2) if count >= 2 else 0,
+        }
+
+
+weather_history = WeatherHistory()
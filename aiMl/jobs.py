@@ -0,0 +1,150 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from metrics import MonitoredExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(BASE_DIR, "jobs.db"))
+# Worker threads for batch jobs, kept separate from the interactive request executor
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "3"))
+MAX_JOB_LOCATIONS = int(os.getenv("MAX_JOB_LOCATIONS", "10000"))
+
+
+# ---------------- JOB STORE ---------------- #
+class JobStore:
+    """SQLite-backed store for batch jobs and their per-location results."""
+
+    def __init__(self, db_path=JOBS_DB):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    location TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    result TEXT,
+                    finished_at REAL,
+                    PRIMARY KEY (job_id, idx)
+                );
+            """)
+            self._conn.commit()
+
+    def create(self, locations, days):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, days, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, days, len(locations), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, location) VALUES (?, ?, ?)",
+                [(job_id, i, loc) for i, loc in enumerate(locations)]
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def mark_running(self, job_id):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                               (time.time(), job_id))
+            self._conn.commit()
+
+    def record(self, job_id, idx, result):
+        """Store one location's result; marks the job finished once every item is in."""
+        failed = "error" in result
+        counter = "failed" if failed else "done"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, finished_at = ? WHERE job_id = ? AND idx = ?",
+                ("failed" if failed else "done", json.dumps(result, ensure_ascii=False), now, job_id, idx)
+            )
+            self._conn.execute(
+                f"UPDATE jobs SET {counter} = {counter} + 1, "
+                "updated_at = ?, status = CASE WHEN done + failed + 1 >= total THEN 'finished' ELSE status END "
+                "WHERE id = ?",
+                (now, job_id)
+            )
+            self._conn.commit()
+
+    def results(self, job_id, offset=0, limit=100):
+        """Finished results with idx >= offset, in request order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, result FROM job_items WHERE job_id = ? AND idx >= ? AND result IS NOT NULL "
+                "ORDER BY idx LIMIT ?",
+                (job_id, offset, limit)
+            ).fetchall()
+        return [{"index": r["idx"], **json.loads(r["result"])} for r in rows]
+
+    def pending(self, job_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, location FROM job_items WHERE job_id = ? AND status = 'pending' ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return [(r["idx"], r["location"]) for r in rows]
+
+    def unfinished_jobs(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, days FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [(r["id"], r["days"]) for r in rows]
+
+
+# ---------------- SCHEDULER ---------------- #
+class JobScheduler:
+    """Runs job items on a dedicated pool so large sweeps don't compete with /api/predict threads."""
+
+    def __init__(self, store, process, max_workers=JOB_WORKERS):
+        self.store = store
+        self.process = process  # process(location, days) -> result dict
+        self.executor = MonitoredExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, locations, days):
+        job_id = self.store.create(locations, days)
+        self._enqueue(job_id, days, list(enumerate(locations)))
+        return job_id
+
+    def resume(self):
+        """Re-queue items of jobs interrupted by a restart."""
+        for job_id, days in self.store.unfinished_jobs():
+            self._enqueue(job_id, days, self.store.pending(job_id))
+
+    def _enqueue(self, job_id, days, items):
+        for idx, loc in items:
+            self.executor.submit(self._run_item, job_id, idx, loc, days)
+
+    def _run_item(self, job_id, idx, loc, days):
+        self.store.mark_running(job_id)
+        try:
+            result = self.process(loc, days)
+        except Exception as e:
+            result = {"Location": loc, "error": str(e)}
+        self.store.record(job_id, idx, result)
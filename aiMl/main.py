@@ -1,8 +1,16 @@
 # main.py
 import os
-import requests
+import shutil
 from dotenv import load_dotenv
 import math, time, datetime, json, numpy as np
+from collections import defaultdict
+from concurrent.futures import wait
+from geocache import geocode_cache, gazetteer
+from cache import cached_call, cache_lookup, cache_put, distinct_cells, last_known_value, today_window
+from providers import http_get
+from metrics import STAGE_SECONDS, CACHE_REQUESTS, PROVIDER_FALLBACKS, MonitoredExecutor
+from tilecache import tile_cache, tile_xy, tile_center
+from history import weather_history, location_key, key_coordinates, DAILY_COLUMNS
 
 load_dotenv()
 
@@ -10,16 +18,47 @@ load_dotenv()
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 OPENMETEO_API_URL = os.getenv("OPENMETEO_API_URL", "https://api.open-meteo.com/v1/forecast")
 
+# Overall deadline (seconds) for all upstream sources of a single location
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "12"))
+# Shared bounded pool used to fan out the per-location provider fetches
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+# Max coordinates per multi-location Open-Meteo request (keeps the URL well under server limits)
+OPENMETEO_BATCH_SIZE = int(os.getenv("OPENMETEO_BATCH_SIZE", "100"))
+
 # Sanity check
 if not all([OPENWEATHER_API_KEY, OPENMETEO_API_URL]):
     print("⚠️ Missing required environment variables.")
 
 
+INDIA_BOUNDS = {"lat_min": 6.0, "lat_max": 37.5, "lon_min": 68.0, "lon_max": 97.5}
+
+
 # ---------------- LOCATION FETCH ---------------- #
 def get_coordinates(location: str):
-    """Get coordinates strictly within India. Uses OpenWeather first, falls back to OpenStreetMap."""
-    INDIA_BOUNDS = {"lat_min": 6.0, "lat_max": 37.5, "lon_min": 68.0, "lon_max": 97.5}
+    """
+    Get coordinates strictly within India.
+    Checks the geocode cache and offline gazetteer before going to the network.
+    """
+    with STAGE_SECONDS.time(stage="geocode"):
+        coords = geocode_cache.get(location)
+        if coords is not None:
+            CACHE_REQUESTS.inc(cache="geocode", result="hit")
+            return coords
+        found = gazetteer.match(location)
+        if found is None:
+            CACHE_REQUESTS.inc(cache="geocode", result="miss")
+            coords, source = _geocode_remote(location)
+            geocode_cache.put(location, coords[0], coords[1], source=source)
+            return coords
+        CACHE_REQUESTS.inc(cache="gazetteer", result="hit")
+        # Persist under the gazetteer's own name: a prefix guess is never stored as the answer for the query
+        name, coords = found
+        geocode_cache.put(name, coords[0], coords[1], source="gazetteer")
+        return coords
+
 
+def _geocode_remote(location: str):
+    """Geocode over the network. Uses OpenWeather first, falls back to OpenStreetMap."""
     def within_india(lat, lon):
         return (
             INDIA_BOUNDS["lat_min"] <= lat <= INDIA_BOUNDS["lat_max"]
@@ -28,7 +67,8 @@ def get_coordinates(location: str):
 
     # Try OpenWeather geocoding first
     try:
-        res = requests.get(
+        res = http_get(
+            "openweather",
             "http://api.openweathermap.org/geo/1.0/direct",
             params={"q": location, "limit": 3, "appid": OPENWEATHER_API_KEY},
             timeout=6
@@ -39,14 +79,15 @@ def get_coordinates(location: str):
             lat, lon = float(d["lat"]), float(d["lon"])
             country = d.get("country", "")
             if country == "IN" or within_india(lat, lon):
-                return round(lat, 6), round(lon, 6)
+                return (round(lat, 6), round(lon, 6)), "openweather"
         print("⚠️ No valid Indian coordinate found from OpenWeather, using OSM fallback...")
     except Exception:
         print("⚠️ OpenWeather geocode failed, using OSM...")
 
     # Fallback to OpenStreetMap (India only)
     try:
-        r = requests.get(
+        r = http_get(
+            "nominatim",
             "https://nominatim.openstreetmap.org/search",
             params={
                 "q": location,
@@ -61,7 +102,7 @@ def get_coordinates(location: str):
         if d:
             lat, lon = float(d[0]["lat"]), float(d[0]["lon"])
             if within_india(lat, lon):
-                return round(lat, 6), round(lon, 6)
+                return (round(lat, 6), round(lon, 6)), "nominatim"
     except Exception:
         pass
 
@@ -69,106 +110,207 @@ def get_coordinates(location: str):
 
 
 
+# ---------------- FALLBACK DEFAULTS ---------------- #
+# Values used when a provider fails or does not answer before the deadline
+OPENWEATHER_DEFAULTS = {"clouds": 0, "humidity": 0, "pressure": 0, "temperature": 0, "visibility": 0, "wind_speed": 0}
+OPENMETEO_DEFAULTS = {"hist_mean_temp": 0, "hist_sum_precip": 0, "hist_mean_wind": 0, "hist_temp_trend": 0}
+MARINE_DEFAULTS = {"chlorophyll": 0.4, "salinity": 35.0, "turbidity": 1.0}
+NASA_DEFAULTS = {"solar_rad": 180, "soil_moist": 0.25}
+SOURCE_DEFAULTS = {
+    "openweather": OPENWEATHER_DEFAULTS,
+    "openmeteo": OPENMETEO_DEFAULTS,
+    "copernicus": MARINE_DEFAULTS,
+    "nasa_power": NASA_DEFAULTS,
+}
+# Model/response features derived from each source, reported in stale_features when it wasn't live
+SOURCE_FEATURES = {
+    "openweather": ["temp", "humidity", "wind_speed", "clouds", "pressure", "visibility"],
+    "openmeteo": ["precip", "hist_mean_temp", "hist_mean_wind", "hist_temp_trend"],
+    "copernicus": ["ndwi", "ndti"],
+    "nasa_power": ["solar_rad", "soil_moist"],
+}
+# Shortest wait given to the providers when a budget is almost used up, so cache hits still count
+MIN_FETCH_WAIT = 0.02
+
+
 # ---------------- WEATHER DATA ---------------- #
 def get_openweather_current(lat, lon):
     """Fetch current weather data from OpenWeather."""
-    try:
-        r = requests.get(
-            "https://api.openweathermap.org/data/2.5/weather",
-            params={"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"},
-            timeout=6
-        )
-        w = r.json()
-        return {
-            "clouds": float(w["clouds"]["all"]),
-            "humidity": float(w["main"]["humidity"]),
-            "pressure": float(w["main"]["pressure"]),
-            "temperature": float(w["main"]["temp"]),
-            "visibility": int(w.get("visibility", 10000)),
-            "wind_speed": float(w["wind"]["speed"]),
-        }
-    except Exception as e:
-        print("⚠️ OpenWeather fetch failed:", e)
-        return {"clouds": 0, "humidity": 0, "pressure": 0, "temperature": 0, "visibility": 0, "wind_speed": 0}
+    with STAGE_SECONDS.time(stage="openweather"):
+        try:
+            return cached_call("openweather", lat, lon, None, lambda: _fetch_openweather_current(lat, lon))
+        except Exception as e:
+            print("⚠️ OpenWeather fetch failed:", e)
+            PROVIDER_FALLBACKS.inc(provider="openweather", reason="error")
+            return dict(OPENWEATHER_DEFAULTS)
+
+
+def _fetch_openweather_current(lat, lon):
+    r = http_get(
+        "openweather",
+        "https://api.openweathermap.org/data/2.5/weather",
+        params={"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"},
+        timeout=6
+    )
+    w = r.json()
+    return {
+        "clouds": float(w["clouds"]["all"]),
+        "humidity": float(w["main"]["humidity"]),
+        "pressure": float(w["main"]["pressure"]),
+        "temperature": float(w["main"]["temp"]),
+        "visibility": int(w.get("visibility", 10000)),
+        "wind_speed": float(w["wind"]["speed"]),
+    }
 
 
 def get_openmeteo_historical(lat, lon, days=90):
     """Historical weather aggregates from Open-Meteo."""
+    with STAGE_SECONDS.time(stage="openmeteo"):
+        try:
+            return cached_call("openmeteo", lat, lon, today_window(days),
+                               lambda: _fetch_openmeteo_historical(lat, lon, days))
+        except Exception:
+            PROVIDER_FALLBACKS.inc(provider="openmeteo", reason="error")
+            return dict(OPENMETEO_DEFAULTS)
+
+
+def _fetch_openmeteo_historical(lat, lon, days):
+    """Fetch the days of the window not stored yet (earlier and later gaps alike), then aggregate it."""
+    key = location_key(lat, lon)
     today = datetime.date.today()
     start = today - datetime.timedelta(days=days)
-    try:
-        r = requests.get(
-            OPENMETEO_API_URL.replace("forecast", "archive"),
-            params={
-                "latitude": lat,
-                "longitude": lon,
-                "start_date": start.isoformat(),
-                "end_date": today.isoformat(),
-                "daily": "temperature_2m_mean,precipitation_sum,windspeed_10m_max",
-                "timezone": "auto",
-            },
-            timeout=8
-        )
-        data = r.json().get("daily", {})
-        temps = data.get("temperature_2m_mean", [])
-        precs = data.get("precipitation_sum", [])
-        winds = data.get("windspeed_10m_max", [])
-        mean_temp = float(np.mean(temps)) if temps else 0
-        sum_precip = float(np.sum(precs)) if precs else 0
-        mean_wind = float(np.mean(winds)) if winds else 0
-        temp_trend = float(temps[-1] - temps[0]) if len(temps) >= 2 else 0
-    except Exception:
-        mean_temp = sum_precip = mean_wind = temp_trend = 0
+    with weather_history.key_lock(key):
+        cell_lat, cell_lon = key_coordinates(key)
+        for first, last in weather_history.missing_ranges(key, start, today):
+            weather_history.ingest(key, _fetch_openmeteo_daily(cell_lat, cell_lon, first, last))
+    return weather_history.aggregates(key, start, today)
 
-    return {
-        "hist_mean_temp": round(mean_temp, 2),
-        "hist_sum_precip": round(sum_precip, 3),
-        "hist_mean_wind": round(mean_wind, 2),
-        "hist_temp_trend": round(temp_trend, 2),
-    }
+
+def _fetch_openmeteo_daily(lat, lon, start, end):
+    return _fetch_openmeteo_daily_many([(lat, lon)], start, end)[0]
+
+
+def _fetch_openmeteo_daily_many(points, start, end):
+    """'daily' blocks for several coordinates in one request (Open-Meteo takes comma-separated lists)."""
+    r = http_get(
+        "openmeteo",
+        OPENMETEO_API_URL.replace("forecast", "archive"),
+        params={
+            "latitude": ",".join(str(lat) for lat, _ in points),
+            "longitude": ",".join(str(lon) for _, lon in points),
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "daily": ",".join(DAILY_COLUMNS),
+            "timezone": "auto",
+        },
+        timeout=8 + len(points) // 10
+    )
+    data = r.json()
+    # A single coordinate comes back as one object, several as a list in request order
+    items = data if isinstance(data, list) else [data]
+    if len(items) != len(points):
+        raise ValueError(f"Open-Meteo returned {len(items)} locations for {len(points)} requested")
+    return [item.get("daily", {}) for item in items]
+
+
+def prefetch_openmeteo(coords, days=90):
+    """
+    Bring the stored history of every coordinate's cell up to date with as few requests as possible
+    (cells needing the same date range share multi-location requests), then cache their aggregates
+    so the per-location get_openmeteo_historical calls are cache hits.
+    """
+    today = datetime.date.today()
+    start = today - datetime.timedelta(days=days)
+    window = today_window(days)
+    cells = {}
+    for lat, lon in coords:
+        key = location_key(lat, lon)
+        if key not in cells and cache_lookup("openmeteo", lat, lon, window) is None:
+            cells[key] = (lat, lon)
+
+    # Cells missing the same date ranges are fetched together
+    by_gaps = defaultdict(list)
+    for key in cells:
+        by_gaps[tuple(weather_history.missing_ranges(key, start, today))].append(key)
+
+    ready = []
+    for gaps, keys in by_gaps.items():
+        for i in range(0, len(keys), OPENMETEO_BATCH_SIZE):
+            chunk = keys[i:i + OPENMETEO_BATCH_SIZE]
+            try:
+                for first, last in gaps:
+                    dailies = _fetch_openmeteo_daily_many([key_coordinates(k) for k in chunk], first, last)
+                    for key, daily in zip(chunk, dailies):
+                        with weather_history.key_lock(key):
+                            weather_history.ingest(key, daily)
+            except Exception as e:
+                # Those cells fall back to the per-location path
+                print(f"⚠️ Open-Meteo bulk fetch of {len(chunk)} locations failed:", e)
+                continue
+            ready.extend(chunk)
+
+    for key in ready:
+        try:
+            cache_put("openmeteo", *cells[key], window, weather_history.aggregates(key, start, today))
+        except LookupError:
+            pass
+    return len(ready)
 
 
 # ---------------- SATELLITE & ENVIRONMENT DATA ---------------- #
 def get_copernicus_marine(lat, lon):
     """Fetch chlorophyll, salinity, turbidity (surface-level) from Copernicus Marine API."""
-    try:
-        r = requests.get(
-            "https://marine.copernicus.eu/api/v1/nrt-data",
-            params={
-                "latitude": lat,
-                "longitude": lon,
-                "variables": "chl,sal,turb",
-                "depth": 0,
-            },
-            timeout=10
-        )
-        d = r.json()
-        chl = d.get("chl", 0.4)
-        sal = d.get("sal", 35.0)
-        turb = d.get("turb", 1.0)
-    except Exception:
-        chl, sal, turb = 0.4, 35.0, 1.0
+    with STAGE_SECONDS.time(stage="copernicus"):
+        try:
+            return cached_call("copernicus", lat, lon, today_window(), lambda: _fetch_copernicus_marine(lat, lon))
+        except Exception:
+            PROVIDER_FALLBACKS.inc(provider="copernicus", reason="error")
+            return dict(MARINE_DEFAULTS)
+
+
+def _fetch_copernicus_marine(lat, lon):
+    r = http_get(
+        "copernicus",
+        "https://marine.copernicus.eu/api/v1/nrt-data",
+        params={
+            "latitude": lat,
+            "longitude": lon,
+            "variables": "chl,sal,turb",
+            "depth": 0,
+        },
+        timeout=10
+    )
+    d = r.json()
+    chl = d.get("chl", MARINE_DEFAULTS["chlorophyll"])
+    sal = d.get("sal", MARINE_DEFAULTS["salinity"])
+    turb = d.get("turb", MARINE_DEFAULTS["turbidity"])
     return {"chlorophyll": chl, "salinity": sal, "turbidity": turb}
 
 
 def get_nasa_power(lat, lon):
     """Fetch environmental surface data like solar radiation and soil moisture."""
-    try:
-        url = f"https://power.larc.nasa.gov/api/temporal/daily/point"
-        r = requests.get(url, params={
-            "parameters": "ALLSKY_SFC_SW_DWN,SOILM_TOT",
-            "community": "RE",
-            "longitude": lon,
-            "latitude": lat,
-            "start": (datetime.date.today() - datetime.timedelta(days=3)).strftime("%Y%m%d"),
-            "end": datetime.date.today().strftime("%Y%m%d"),
-            "format": "JSON"
-        }, timeout=10)
-        data = r.json()["properties"]["parameter"]
-        rad = np.mean(list(data["ALLSKY_SFC_SW_DWN"].values()))
-        soil = np.mean(list(data["SOILM_TOT"].values()))
-    except Exception:
-        rad, soil = 180, 0.25
+    with STAGE_SECONDS.time(stage="nasa_power"):
+        try:
+            return cached_call("nasa_power", lat, lon, today_window(), lambda: _fetch_nasa_power(lat, lon))
+        except Exception:
+            PROVIDER_FALLBACKS.inc(provider="nasa_power", reason="error")
+            return dict(NASA_DEFAULTS)
+
+
+def _fetch_nasa_power(lat, lon):
+    url = f"https://power.larc.nasa.gov/api/temporal/daily/point"
+    r = http_get("nasa_power", url, params={
+        "parameters": "ALLSKY_SFC_SW_DWN,SOILM_TOT",
+        "community": "RE",
+        "longitude": lon,
+        "latitude": lat,
+        "start": (datetime.date.today() - datetime.timedelta(days=3)).strftime("%Y%m%d"),
+        "end": datetime.date.today().strftime("%Y%m%d"),
+        "format": "JSON"
+    }, timeout=10)
+    data = r.json()["properties"]["parameter"]
+    rad = float(np.mean(list(data["ALLSKY_SFC_SW_DWN"].values())))
+    soil = float(np.mean(list(data["SOILM_TOT"].values())))
     return {"solar_rad": round(rad, 2), "soil_moist": round(soil, 3)}
 
 
@@ -182,13 +324,120 @@ def compute_satellite_indices(lat, lon, chl, sal, turb):
 
 
 # ---------------- MASTER FUNCTION ---------------- #
-def get_live_features(location, past_days=90):
-    lat, lon = get_coordinates(location)
+_fetch_pool = MonitoredExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+def fetch_pool():
+    """The shared upstream fetch pool, for callers that fan out their own provider calls."""
+    return _fetch_pool
+
+
+def fetch_sources(lat, lon, past_days=90, deadline=None):
+    """
+    Run all provider fetches for one coordinate concurrently, waiting at most `deadline` seconds.
+    A source that fails or misses the deadline falls back to the last known value for its grid cell
+    (status "stale"), or to its constant defaults if there is none (status "default").
+    Late fetches keep running and fill the cache for the next request.
+    Returns (results_by_source, timed_out_sources, status_by_source).
+    """
+    deadline = FETCH_DEADLINE if deadline is None else deadline
+    futures = {name: _fetch_pool.submit(fetch_provider, name, lat, lon, past_days) for name in SOURCE_DEFAULTS}
+    with STAGE_SECONDS.time(stage="fetch_sources"):
+        wait(futures.values(), timeout=deadline)
+
+    results, timed_out, status = {}, [], {}
+    for name, fut in futures.items():
+        if fut.done() and fut.exception() is None:
+            results[name], status[name] = fut.result(), "live"
+            continue
+        if fut.done():
+            reason = "error"
+            print(f"⚠️ {name} fetch failed:", fut.exception())
+        else:
+            reason = "timeout"
+            fut.cancel()
+            timed_out.append(name)
+        PROVIDER_FALLBACKS.inc(provider=name, reason=reason)
+        value = last_known_value(name, lat, lon, provider_window(name, past_days))
+        if value is not None:
+            results[name], status[name] = value, "stale"
+        else:
+            results[name], status[name] = dict(SOURCE_DEFAULTS[name]), "default"
+    if timed_out:
+        print(f"⚠️ Sources timed out after {deadline:.2f}s:", ", ".join(timed_out))
+    return results, timed_out, status
+
+
+def prefetch_batch(locations, past_days=90):
+    """
+    Warm the caches for a batch before its per-location feature fetches: geocode in parallel,
+    update Open-Meteo history with multi-location requests and fetch NASA POWER once per grid cell.
+    Failures are left for the per-location path to report.
+    """
+    with STAGE_SECONDS.time(stage="prefetch"):
+        coords = []
+        for fut in [_fetch_pool.submit(get_coordinates, loc) for loc in locations]:
+            try:
+                coords.append(fut.result())
+            except Exception:
+                pass
+        prefetch_coordinates(coords, past_days)
+
+
+def prefetch_coordinates(coords, past_days=90):
+    """The batched part of prefetch_batch, for callers that already have coordinates (e.g. the risk grid)."""
+    if not coords:
+        return
+    # POWER's point API takes one coordinate, so dedupe by its 0.5x0.625 degree grid instead
+    nasa = [_fetch_pool.submit(get_nasa_power, lat, lon) for lat, lon in distinct_cells("nasa_power", coords)]
+    prefetch_openmeteo(coords, past_days)
+    wait(nasa)
+
+
+def get_live_features(location, past_days=90, budget=None):
+    """
+    Features for a place name. `budget` (seconds) bounds the whole call, geocoding included;
+    providers that haven't answered when it runs out are served from their last known values.
+    """
+    with STAGE_SECONDS.time(stage="get_live_features"):
+        start = time.monotonic()
+        lat, lon = coordinates_within(location, budget)
+        deadline = None if budget is None else max(MIN_FETCH_WAIT, budget - (time.monotonic() - start))
+        return features_for_coordinates(lat, lon, past_days=past_days, deadline=deadline)
+
 
-    current = get_openweather_current(lat, lon)
-    hist = get_openmeteo_historical(lat, lon, days=past_days)
-    marine = get_copernicus_marine(lat, lon)
-    nasa = get_nasa_power(lat, lon)
+def coordinates_within(location, budget=None):
+    """
+    get_coordinates, but waiting at most `budget` seconds for a network geocode. On timeout the
+    lookup keeps running on the fetch pool (its result still lands in the geocode cache) and
+    TimeoutError is raised, since nothing can be served without coordinates.
+    """
+    if budget is None:
+        return get_coordinates(location)
+    coords = geocode_cache.get(location)
+    if coords is not None:
+        CACHE_REQUESTS.inc(cache="geocode", result="hit")
+        return coords
+    future = _fetch_pool.submit(get_coordinates, location)
+    done, _ = wait([future], timeout=budget)
+    if not done:
+        raise TimeoutError(f"Geocoding {location!r} did not finish within {budget:.2f}s")
+    return future.result()
+
+
+def features_for_coordinates(lat, lon, past_days=90, deadline=None):
+    """Model features for an already-known coordinate (no geocoding)."""
+    results, timed_out, status = fetch_sources(lat, lon, past_days=past_days, deadline=deadline)
+    return assemble_features(lat, lon, results, timed_out, status)
+
+
+def assemble_features(lat, lon, results, timed_out=(), status=None):
+    """Model features from per-provider results (as returned by fetch_sources or fetch_provider)."""
+    status = status or {name: "live" for name in results}
+    current = results["openweather"]
+    hist = results["openmeteo"]
+    marine = results["copernicus"]
+    nasa = results["nasa_power"]
     indices = compute_satellite_indices(lat, lon, marine["chlorophyll"], marine["salinity"], marine["turbidity"])
 
     features = {
@@ -208,10 +457,35 @@ def get_live_features(location, past_days=90):
         "pressure": current["pressure"],
         "visibility": current["visibility"],
         "solar_rad": nasa["solar_rad"],
-        "soil_moist": nasa["soil_moist"]
+        "soil_moist": nasa["soil_moist"],
+        "timed_out_sources": list(timed_out),
+        "source_status": dict(status),
+        "stale_features": [f for name, state in status.items() if state != "live" for f in SOURCE_FEATURES[name]],
     }
     return features
 
+
+def fetch_provider(provider, lat, lon, past_days=90):
+    """
+    One provider's data through the response cache, raising on failure instead of
+    returning fallback defaults (for callers that would rather keep their last good value).
+    """
+    fetchers = {
+        "openweather": lambda: _fetch_openweather_current(lat, lon),
+        "openmeteo": lambda: _fetch_openmeteo_historical(lat, lon, past_days),
+        "copernicus": lambda: _fetch_copernicus_marine(lat, lon),
+        "nasa_power": lambda: _fetch_nasa_power(lat, lon),
+    }
+    with STAGE_SECONDS.time(stage=provider):
+        return cached_call(provider, lat, lon, provider_window(provider, past_days), fetchers[provider])
+
+
+def provider_window(provider, past_days=90):
+    """Date window part of a provider's cache key (see the get_* fetchers above)."""
+    if provider == "openweather":
+        return None
+    return today_window(past_days) if provider == "openmeteo" else today_window()
+
 # Bettina
 # ---------------- SATELLITE IMAGES ---------------- #
 def get_satellite_image(lat, lon, zoom=8, size="600x600", map_type="satellite", api_key=None):
@@ -224,15 +498,26 @@ def get_satellite_image(lat, lon, zoom=8, size="600x600", map_type="satellite",
         map_type: 'satellite', 'roadmap', 'terrain', 'hybrid'
         api_key: Your Google Maps API key
     Returns:
-        Image bytes
+        Image bytes (a read-only memoryview over the cached file)
+    """
+    path = get_satellite_image_path(lat, lon, zoom=zoom, size=size, map_type=map_type, api_key=api_key)
+    return tile_cache.view(path) if path else None
+
+
+def get_satellite_image_path(lat, lon, zoom=8, size="600x600", map_type="satellite", api_key=None):
+    """
+    Path of the cached image for the map tile containing (lat, lon).
+    The request is centred on the tile so every coordinate in the tile shares one download.
     """
     if not api_key:
         print("No Google Maps API key provided, cannot fetch satellite image.")
         return None
 
+    x, y = tile_xy(lat, lon, zoom)
+    center_lat, center_lon = tile_center(x, y, zoom)
     url = "https://maps.googleapis.com/maps/api/staticmap"
     params = {
-        "center": f"{lat},{lon}",
+        "center": f"{center_lat},{center_lon}",
         "zoom": zoom,
         "size": size,
         "maptype": map_type,
@@ -240,31 +525,30 @@ def get_satellite_image(lat, lon, zoom=8, size="600x600", map_type="satellite",
     }
 
     try:
-        import requests
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            return response.content  # You can save this as an image file
-        else:
-            print(f"Failed to fetch satellite image: {response.status_code}")
+        return tile_cache.fetch(
+            tile_cache.path_for(x, y, zoom, size, map_type),
+            lambda: http_get("google_maps", url, params=params, timeout=10, stream=True)
+        )
     except Exception as e:
         print("Error fetching satellite image:", e)
         return None
 
 
-def save_satellite_image(lat, lon, filename="sat_image.png", api_key=None):
-    """Fetch and save satellite image locally."""
-    img_bytes = get_satellite_image(lat, lon, api_key=api_key)
-    if img_bytes:
-        with open(filename, "wb") as f:
-            f.write(img_bytes)
+def save_satellite_image(lat, lon, filename=None, api_key=None):
+    """Fetch the satellite image into the tile cache; copies it to filename if one is given."""
+    path = get_satellite_image_path(lat, lon, api_key=api_key)
+    if path and filename:
+        shutil.copyfile(path, filename)
         print(f"Satellite image saved as {filename}")
         return filename
-    return None
+    return path
+
+
 def get_live_features_with_image(location, past_days=90, google_api_key=None):
     features = get_live_features(location, past_days=past_days)
-    
+
     # Fetch satellite image
     img_file = save_satellite_image(features["lat"], features["lon"], api_key=google_api_key)
-    features["satellite_image"] = img_file  # path to saved image
-    
+    features["satellite_image"] = img_file  # path to cached image
+
     return features
@@ -0,0 +1,193 @@
+# metrics.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Latency buckets (seconds) shared by every histogram
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_str(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                labels = _label_str(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge read at scrape time from callbacks, one per label set."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._callbacks = {}
+
+    def set_function(self, fn, **labels):
+        self._callbacks[tuple(labels[n] for n in self.labelnames)] = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, fn in sorted(self._callbacks.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "aquascope_stage_seconds", "Latency of prediction pipeline stages.", ["stage"]))
+PROVIDER_SECONDS = registry.register(Histogram(
+    "aquascope_provider_request_seconds", "Latency of upstream HTTP requests.", ["provider"]))
+PROVIDER_REQUESTS = registry.register(Counter(
+    "aquascope_provider_requests_total", "Upstream requests by outcome (ok, error, throttled, circuit_open).",
+    ["provider", "outcome"]))
+PROVIDER_FALLBACKS = registry.register(Counter(
+    "aquascope_provider_fallbacks_total", "Times a provider's fallback defaults were used instead of live data.",
+    ["provider", "reason"]))
+CACHE_REQUESTS = registry.register(Counter(
+    "aquascope_cache_requests_total", "Cache lookups by cache and result (hit, miss, or stale for served-while-refreshing).", ["cache", "result"]))
+INFERENCE_ROWS = registry.register(Counter(
+    "aquascope_inference_rows_total", "Rows scored by the model."))
+HTTP_SECONDS = registry.register(Histogram(
+    "aquascope_http_request_seconds", "Flask request latency by endpoint and status.", ["endpoint", "status"]))
+QUEUE_DEPTH = registry.register(Gauge(
+    "aquascope_executor_queue_depth", "Tasks waiting in a thread pool queue.", ["pool"]))
+ADMISSION_DECISIONS = registry.register(Counter(
+    "aquascope_admission_decisions_total", "Admission control outcomes for live requests (admit, degrade, shed).",
+    ["decision"]))
+WATCHLIST_EVENTS = registry.register(Counter(
+    "aquascope_watchlist_events_total", "Watchlist work: provider refreshes, rescored locations and alerts.",
+    ["event"]))
+PREDLOG_ROWS = registry.register(Counter(
+    "aquascope_predlog_rows_total", "Prediction log rows by event (appended, flushed, compacted).", ["event"]))
+
+
+class MonitoredExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts the tasks submitted but not started yet (see queue_depth)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    def _dequeue(self):
+        with self._queued_lock:
+            self._queued -= 1
+
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            self._dequeue()
+            return fn(*args, **kwargs)
+
+        with self._queued_lock:
+            self._queued += 1
+        try:
+            future = super().submit(run)
+        except BaseException:
+            self._dequeue()
+            raise
+        # Only a task that is still queued can be cancelled; it never runs, so it leaves the count here
+        future.add_done_callback(lambda f: f.cancelled() and self._dequeue())
+        return future
+
+    def queue_depth(self):
+        return self._queued
+
+
+def queue_depth(*executors):
+    """Tasks waiting to start across MonitoredExecutors."""
+    return sum(executor.queue_depth() for executor in executors)
+
+
+def watch_executor(pool_name, executor):
+    """Export the pending work queue length of a MonitoredExecutor."""
+    QUEUE_DEPTH.set_function(executor.queue_depth, pool=pool_name)
@@ -1,12 +1,50 @@
 # model.py
+import os
+import glob
+import datetime
+import threading
+import joblib
+import sklearn
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
+from metrics import STAGE_SECONDS, INFERENCE_ROWS
+from flatforest import FlatForest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(BASE_DIR, "models"))
+ARTIFACT_PREFIX = "aquascope-"
+# "flat" scores small batches with the compiled FlatForest evaluator, "sklearn" always uses the forest itself
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "flat")
+# Above this many rows sklearn's own predict is faster than the flat traversal
+FLAT_MAX_ROWS = int(os.getenv("FLAT_MAX_ROWS", "32"))
+
+# Column order of the feature matrix, with the default used for missing values
+FEATURE_ORDER = [
+    ("temp", 0.0),
+    ("humidity", 0.0),
+    ("wind_speed", 0.0),
+    ("precip", 0.0),
+    ("ndwi", 0.0),
+    ("ndti", 0.0),
+    ("hist_mean_temp", 0.0),
+    ("hist_mean_wind", 0.0),
+    ("hist_temp_trend", 0.0),
+    ("aqi", 0),
+    ("solar_rad", 200),
+    ("soil_moist", 0.25),
+]
+FEATURE_NAMES = [name for name, _ in FEATURE_ORDER]
+
 
 class AquaScopeModel:
-    def __init__(self):
+    def __init__(self, engine=INFERENCE_ENGINE):
         self.model = RandomForestRegressor(n_estimators=200, max_depth=8, random_state=42)
+        self.engine = engine
+        self._flat = None
         self._is_trained = False
+        self._train_lock = threading.Lock()
+        self.metadata = {}
 
     def train_dummy(self, n_samples: int = 1500, random_seed: int = 42):
         rng = np.random.RandomState(random_seed)
@@ -35,25 +73,174 @@ class AquaScopeModel:
 
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15)
         self.model.fit(X_train, y_train)
+        self._flat = None
         self._is_trained = True
+        self.metadata = {"source": "train_dummy", "n_samples": n_samples}
+
+    def _ensure_trained(self):
+        if self._is_trained:
+            return
+        with self._train_lock:
+            if not self._is_trained:
+                self.train_dummy()
 
     def predict(self, features: dict):
+        return self.predict_batch([features])[0]
+
+    def predict_batch(self, features):
+        """
+        Score many locations in one forest pass.
+        Accepts a list of feature dicts, a DataFrame with the FEATURE_NAMES columns,
+        or an (n, 12) array in FEATURE_ORDER. Returns results aligned with the input.
+        """
+        return [format_risk(r) for r in self.predict_scores(features)]
+
+    def predict_scores(self, features):
+        """Raw risk scores (float array) for the same inputs as predict_batch."""
+        self._ensure_trained()
+        X = features_matrix(features)
+        if len(X) == 0:
+            return np.empty(0)
+        with STAGE_SECONDS.time(stage="inference"):
+            if self.engine == "flat" and len(X) <= FLAT_MAX_ROWS:
+                scores = self._compiled().predict(X)
+            else:
+                scores = self.model.predict(X)
+        INFERENCE_ROWS.inc(len(X))
+        return scores
+
+    def _compiled(self):
+        if self._flat is None:
+            self._flat = FlatForest.from_sklearn(self.model)
+        return self._flat
+
+    # ---------------- REGISTRY ---------------- #
+    def save(self, model_dir=MODEL_DIR, version=None):
+        """
+        Write the fitted model and its metadata as a versioned artifact, plus the flat evaluator's
+        node arrays as .npy files next to it (memory-mapped by load()).
+        """
         if not self._is_trained:
-            self.train_dummy()
-        arr = np.array([[
-            features.get("temp", 0.0),
-            features.get("humidity", 0.0),
-            features.get("wind_speed", 0.0),
-            features.get("precip", 0.0),
-            features.get("ndwi", 0.0),
-            features.get("ndti", 0.0),
-            features.get("hist_mean_temp", 0.0),
-            features.get("hist_mean_wind", 0.0),
-            features.get("hist_temp_trend", 0.0),
-            features.get("aqi", 0),
-            features.get("solar_rad", 200),
-            features.get("soil_moist", 0.25)
-        ]])
-        risk = float(self.model.predict(arr)[0])
-        label = "🚨 High Risk" if risk >= 75 else "⚠️ Moderate Risk" if risk >= 50 else "✅ Low Risk"
-        return {"Water Contamination Risk Score (%)": round(risk, 1), "Risk Label": label}
+            raise ValueError("Cannot save an untrained model")
+        version = version or datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S")
+        metadata = dict(self.metadata)
+        metadata.update({
+            "version": version,
+            "feature_order": FEATURE_NAMES,
+            "sklearn_version": sklearn.__version__,
+            "saved_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+        os.makedirs(model_dir, exist_ok=True)
+        path = os.path.join(model_dir, f"{ARTIFACT_PREFIX}{version}.joblib")
+        tmp = path + ".tmp"
+        joblib.dump({"model": self.model, "metadata": metadata}, tmp, compress=0)
+        self._compiled().save(flat_path(path))
+        os.replace(tmp, path)
+        self.metadata = metadata
+        return path
+
+    @classmethod
+    def load(cls, path=None, mmap_mode="r"):
+        """
+        Load a saved artifact (latest version by default).
+        The sklearn forest is unpickled into private memory (its trees copy their arrays on load);
+        the flat evaluator that scores small batches is memory-mapped from the .npy files with
+        mmap_mode, so processes using the same artifact share those pages. Artifacts saved
+        before the .npy files existed get them written on first load.
+        """
+        path = path or latest_artifact()
+        if path is None:
+            raise FileNotFoundError(f"No model artifact found in {MODEL_DIR}")
+        payload = joblib.load(path)
+        metadata = payload.get("metadata", {})
+        if metadata.get("feature_order") != FEATURE_NAMES:
+            raise ValueError(
+                f"Model artifact {path} expects features {metadata.get('feature_order')}, "
+                f"this code provides {FEATURE_NAMES}"
+            )
+        inst = cls()
+        inst.model = payload["model"]
+        inst.metadata = metadata
+        inst._is_trained = True
+        flat_dir = flat_path(path)
+        if not os.path.isdir(flat_dir):
+            try:
+                inst._compiled().save(flat_dir)
+            except OSError as e:
+                print(f"⚠️ Could not write flat arrays for {path}: {e}")
+                return inst
+        inst._flat = FlatForest.load(flat_dir, mmap_mode=mmap_mode)
+        return inst
+
+
+def features_matrix(features):
+    """Build the (n, 12) model input from dicts, a DataFrame or an existing array."""
+    if hasattr(features, "columns"):
+        X = np.asarray(features[FEATURE_NAMES], dtype=float)
+    elif isinstance(features, np.ndarray):
+        X = np.asarray(features, dtype=float)
+    else:
+        X = np.array([[f.get(name, default) for name, default in FEATURE_ORDER] for f in features], dtype=float)
+    if X.size == 0:
+        return X.reshape(0, len(FEATURE_ORDER))
+    if X.ndim != 2 or X.shape[1] != len(FEATURE_ORDER):
+        raise ValueError(f"Expected a feature matrix of shape (n, {len(FEATURE_ORDER)}), got {X.shape}")
+    return X
+
+
+def risk_label(risk):
+    return "🚨 High Risk" if risk >= 75 else "⚠️ Moderate Risk" if risk >= 50 else "✅ Low Risk"
+
+
+def format_risk(risk):
+    risk = float(risk)
+    return {"Water Contamination Risk Score (%)": round(risk, 1), "Risk Label": risk_label(risk)}
+
+
+def flat_path(artifact_path):
+    """Directory holding the flat evaluator's .npy arrays for an artifact."""
+    return os.path.splitext(artifact_path)[0] + ".flat"
+
+
+def list_artifacts(model_dir=MODEL_DIR):
+    """Saved artifacts, oldest first (versions are UTC timestamps so they sort by name)."""
+    return sorted(glob.glob(os.path.join(model_dir, f"{ARTIFACT_PREFIX}*.joblib")))
+
+
+def latest_artifact(model_dir=MODEL_DIR):
+    artifacts = list_artifacts(model_dir)
+    return artifacts[-1] if artifacts else None
+
+
+def load_or_train(model_dir=MODEL_DIR):
+    """Load the latest artifact; if there is none yet, train the dummy model once and save it."""
+    path = latest_artifact(model_dir)
+    if path is not None:
+        return AquaScopeModel.load(path)
+    print("⚠️ No saved model found, training a new one...")
+    model = AquaScopeModel()
+    model.train_dummy()
+    print("Model saved to", model.save(model_dir))
+    return model
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_model(model_dir=MODEL_DIR):
+    """
+    The process-wide model, loaded on first use. A pre-fork server calls this in the parent
+    so every worker inherits the same (copy-on-write) model pages.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = load_or_train(model_dir)
+        return _shared
+
+
+if __name__ == "__main__":
+    m = AquaScopeModel()
+    m.train_dummy()
+    print("Model saved to", m.save())
@@ -0,0 +1,373 @@
+# predlog.py
+"""
+Append-only columnar log of every prediction and the feature vector it was scored on.
+
+Rows are buffered in memory and flushed as immutable .npz segments into one directory
+per UTC day (PREDLOG_DIR/YYYY-MM-DD/). Each segment holds one array per column, with
+location keys dictionary-encoded, so a query loads only the columns it needs from only
+the partitions inside its time range. A background compactor merges the segments of a
+partition into a single compressed file sorted by (location, time); the merged file
+lists the segments it replaces, so readers never count a row twice while it runs.
+
+    python predlog.py --top --days 30      # riskiest locations over the last 30 days
+    python predlog.py --compact            # merge segments now
+"""
+import os
+import glob
+import json
+import time
+import atexit
+import argparse
+import datetime
+import threading
+import numpy as np
+from model import FEATURE_NAMES, features_matrix
+from metrics import PREDLOG_ROWS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDLOG_DIR = os.getenv("PREDLOG_DIR", os.path.join(BASE_DIR, "prediction_log"))
+# Buffered rows are written as a segment when this many are pending, or after this many seconds
+PREDLOG_FLUSH_ROWS = int(os.getenv("PREDLOG_FLUSH_ROWS", "1000"))
+PREDLOG_FLUSH_SECONDS = float(os.getenv("PREDLOG_FLUSH_SECONDS", "30"))
+# Compact a partition once it has this many segments (past days are always compacted)
+PREDLOG_COMPACT_SEGMENTS = int(os.getenv("PREDLOG_COMPACT_SEGMENTS", "16"))
+PREDLOG_COMPACT_SECONDS = float(os.getenv("PREDLOG_COMPACT_SECONDS", "600"))
+PREDLOG_MAX_DAYS = int(os.getenv("PREDLOG_MAX_DAYS", "366"))
+
+SEGMENT_PREFIX = "seg-"
+COMPACTED_PREFIX = "compact-"
+COLUMNS = ("ts", "key_idx", "lat", "lon", "score", "features")
+
+
+def day_of(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def day_start(day):
+    return datetime.datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def day_range(since, until):
+    """UTC day names covering [since, until] (timestamps)."""
+    day, last = day_of(since), day_of(until)
+    days = []
+    while day <= last:
+        days.append(day)
+        day = day_of(day_start(day) + 86400)
+    return days
+
+
+def _write_npz(path, compressed=False, **arrays):
+    """Write atomically so readers only ever see complete files."""
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        (np.savez_compressed if compressed else np.savez)(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _encode(rows):
+    """Column arrays for (ts, key, location, lat, lon, score, vector) rows."""
+    names, locations, index = [], [], {}
+    key_idx = np.empty(len(rows), dtype=np.int32)
+    for i, (_, key, location, *_rest) in enumerate(rows):
+        if key not in index:
+            index[key] = len(names)
+            names.append(key)
+            locations.append(location)
+        key_idx[i] = index[key]
+    return {
+        "names": np.array(names, dtype=str),
+        "locations": np.array(locations, dtype=str),
+        "ts": np.array([r[0] for r in rows], dtype=np.float64),
+        "key_idx": key_idx,
+        "lat": np.array([r[3] for r in rows], dtype=np.float32),
+        "lon": np.array([r[4] for r in rows], dtype=np.float32),
+        "score": np.array([r[5] for r in rows], dtype=np.float32),
+        "features": np.array([r[6] for r in rows], dtype=np.float32).reshape(len(rows), len(FEATURE_NAMES)),
+    }
+
+
+class PredictionLog:
+    def __init__(self, log_dir=PREDLOG_DIR, flush_rows=PREDLOG_FLUSH_ROWS, flush_seconds=PREDLOG_FLUSH_SECONDS):
+        self.log_dir = log_dir
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        atexit.register(self.flush)
+
+    # ---------------- WRITE ---------------- #
+    def append(self, scored):
+        """Buffer (key, location, features, score) tuples, stamped with the current time."""
+        now = time.time()
+        scored = list(scored)
+        if not scored:
+            return
+        vectors = features_matrix([features for _, _, features, _ in scored])
+        rows = [(now, key, location, float(features["lat"]), float(features["lon"]), float(score), vector)
+                for (key, location, features, score), vector in zip(scored, vectors)]
+        with self._lock:
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.flush_rows
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="predlog-flush", daemon=True)
+                self._flusher.start()
+        PREDLOG_ROWS.inc(len(rows), event="appended")
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write pending rows as one new segment per day partition."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(day_of(row[0]), []).append(row)
+            for day, day_rows in by_day.items():
+                part = os.path.join(self.log_dir, day)
+                os.makedirs(part, exist_ok=True)
+                self._seq += 1
+                # pid + sequence keeps names unique across serve.py workers
+                name = f"{SEGMENT_PREFIX}{time.time_ns()}-{os.getpid()}-{self._seq}.npz"
+                _write_npz(os.path.join(part, name), **_encode(day_rows))
+            if rows:
+                PREDLOG_ROWS.inc(len(rows), event="flushed")
+            return len(rows)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("⚠️ Prediction log flush failed:", e)
+
+    # ---------------- COMPACTION ---------------- #
+    def compact(self, min_segments=PREDLOG_COMPACT_SEGMENTS):
+        """
+        Merge each partition's files into one sorted, compressed file. Today's partition is only
+        merged once it has min_segments files. Run from a single process (the serve.py leader).
+        """
+        today = day_of(time.time())
+        merged = 0
+        for part in sorted(glob.glob(os.path.join(self.log_dir, "????-??-??"))):
+            segments = sorted(glob.glob(os.path.join(part, SEGMENT_PREFIX + "*.npz")))
+            if not segments or (os.path.basename(part) == today and len(segments) < min_segments):
+                continue
+            inputs = sorted(glob.glob(os.path.join(part, COMPACTED_PREFIX + "*.npz"))) + segments
+            cols, names, locations, sources = [], [], [], []
+            for path in inputs:
+                with np.load(path) as z:
+                    c = {k: z[k] for k in COLUMNS}
+                    c["key_idx"] = c["key_idx"] + len(names)
+                    names.extend(z["names"].tolist())
+                    locations.extend(z["locations"].tolist())
+                    if "sources" in z:
+                        sources.extend(z["sources"].tolist())
+                cols.append(c)
+                sources.append(os.path.basename(path))
+            # Re-encode keys over the merged dictionary, keeping the latest display name per key
+            uniq, first = {}, []
+            remap = np.empty(len(names), dtype=np.int32)
+            for i, key in enumerate(names):
+                if key not in uniq:
+                    uniq[key] = len(first)
+                    first.append(i)
+                remap[i] = uniq[key]
+                locations[first[uniq[key]]] = locations[i]
+            data = {k: np.concatenate([c[k] for c in cols]) for k in COLUMNS}
+            data["key_idx"] = remap[data["key_idx"]]
+            order = np.lexsort((data["ts"], data["key_idx"]))
+            data = {k: v[order] for k, v in data.items()}
+            data["names"] = np.array(list(uniq), dtype=str)
+            data["locations"] = np.array([locations[i] for i in first], dtype=str)
+            data["sources"] = np.array(sources, dtype=str)
+
+            _write_npz(os.path.join(part, f"{COMPACTED_PREFIX}{time.time_ns()}.npz"), compressed=True, **data)
+            for path in inputs:
+                os.remove(path)
+            merged += len(inputs)
+            PREDLOG_ROWS.inc(len(order), event="compacted")
+        return merged
+
+    def prune(self, max_days=PREDLOG_MAX_DAYS):
+        """Drop whole partitions older than max_days."""
+        cutoff = day_of(time.time() - max_days * 86400)
+        for part in glob.glob(os.path.join(self.log_dir, "????-??-??")):
+            if os.path.basename(part) < cutoff:
+                for path in glob.glob(os.path.join(part, "*")):
+                    os.remove(path)
+                os.rmdir(part)
+
+    def start_compactor(self, interval=PREDLOG_COMPACT_SECONDS):
+        """Compact (and prune) every interval seconds on a daemon thread."""
+
+        def loop():
+            while True:
+                try:
+                    self.compact()
+                    self.prune()
+                except Exception as e:
+                    print("⚠️ Prediction log compaction failed:", e)
+                time.sleep(interval)
+
+        t = threading.Thread(target=loop, name="predlog-compact", daemon=True)
+        t.start()
+        return t
+
+    # ---------------- READ ---------------- #
+    def _partition_files(self, part):
+        """Files of one partition, minus segments already merged into a listed compacted file."""
+        files = sorted(glob.glob(os.path.join(part, "*.npz")))
+        compacted = [f for f in files if os.path.basename(f).startswith(COMPACTED_PREFIX)]
+        covered = set()
+        for path in compacted:
+            with np.load(path) as z:
+                covered.update(z["sources"].tolist())
+        return [f for f in files if os.path.basename(f) not in covered]
+
+    def _scan(self, since, until, columns, key=None):
+        """
+        Yield column dicts (plus 'names'/'locations') for rows with since <= ts <= until, reading
+        only the partitions in that range, followed by this process's unflushed rows.
+        """
+        for day in day_range(since, until):
+            part = os.path.join(self.log_dir, day)
+            if not os.path.isdir(part):
+                continue
+            for attempt in range(3):
+                try:
+                    chunks = []
+                    for path in self._partition_files(part):
+                        with np.load(path) as z:
+                            chunk = self._select(z, since, until, columns, key)
+                        if chunk is not None:
+                            chunks.append(chunk)
+                    break
+                except FileNotFoundError:
+                    # A compaction replaced files between listing and reading: list again
+                    continue
+            else:
+                raise RuntimeError(f"Prediction log partition {day} kept changing while being read")
+            yield from chunks
+
+        with self._lock:
+            pending = [r for r in self._pending if since <= r[0] <= until]
+        if pending:
+            chunk = self._select(_encode(pending), since, until, columns, key)
+            if chunk is not None:
+                yield chunk
+
+    @staticmethod
+    def _select(z, since, until, columns, key):
+        names = z["names"]
+        ts = z["ts"]
+        mask = (ts >= since) & (ts <= until)
+        if key is not None:
+            hits = np.flatnonzero(names == key)
+            if not len(hits):
+                return None
+            mask &= z["key_idx"] == hits[0]
+        if not mask.any():
+            return None
+        chunk = {c: (ts if c == "ts" else z[c])[mask] for c in columns}
+        chunk["names"] = names
+        chunk["locations"] = z["locations"]
+        return chunk
+
+    def series(self, key, since, until, with_features=False):
+        """Every prediction for one location in [since, until], oldest first."""
+        columns = ["ts", "score", "lat", "lon"] + (["features"] if with_features else [])
+        chunks = list(self._scan(since, until, columns, key=key))
+        if not chunks:
+            return []
+        data = {c: np.concatenate([ch[c] for ch in chunks]) for c in columns}
+        order = np.argsort(data["ts"], kind="stable")
+        points = []
+        for i in order:
+            point = {
+                "at": datetime.datetime.fromtimestamp(data["ts"][i], datetime.timezone.utc).isoformat(),
+                "Water Contamination Risk Score (%)": round(float(data["score"][i]), 1),
+            }
+            if with_features:
+                point["features"] = dict(zip(FEATURE_NAMES, (round(float(v), 4) for v in data["features"][i])))
+            points.append(point)
+        return points
+
+    def rolling(self, key, since, until, window_days=7):
+        """Daily mean score for one location plus its trailing window_days average (weighted by predictions)."""
+        days = day_range(since, until)
+        sums, counts = np.zeros(len(days)), np.zeros(len(days))
+        t0 = day_start(days[0])
+        for chunk in self._scan(since, until, ["ts", "score"], key=key):
+            idx = ((chunk["ts"] - t0) // 86400).astype(int)
+            np.add.at(sums, idx, chunk["score"])
+            np.add.at(counts, idx, 1)
+        csum, ccount = np.concatenate(([0.0], np.cumsum(sums))), np.concatenate(([0.0], np.cumsum(counts)))
+        result = []
+        for i, day in enumerate(days):
+            lo = max(0, i + 1 - window_days)
+            n_window = ccount[i + 1] - ccount[lo]
+            result.append({
+                "date": day,
+                "predictions": int(counts[i]),
+                "mean": round(float(sums[i] / counts[i]), 1) if counts[i] else None,
+                "rolling_mean": round(float((csum[i + 1] - csum[lo]) / n_window), 1) if n_window else None,
+            })
+        return result
+
+    def top(self, since, until, k=10, by="mean"):
+        """The k riskiest locations over [since, until], ranked by mean, max or latest score."""
+        stats = {}  # key -> [location, count, sum, max, latest_ts, latest_score, lat, lon]
+        for chunk in self._scan(since, until, ["ts", "key_idx", "score", "lat", "lon"]):
+            names, locations = chunk["names"], chunk["locations"]
+            idx = chunk["key_idx"]
+            # Aggregate per key inside the chunk with numpy, then merge the (few) per-key rows
+            counts = np.bincount(idx, minlength=len(names))
+            sums = np.bincount(idx, weights=chunk["score"], minlength=len(names))
+            maxes = np.full(len(names), -np.inf)
+            np.maximum.at(maxes, idx, chunk["score"])
+            order = np.lexsort((chunk["ts"], idx))
+            last_of = order[np.r_[idx[order][1:] != idx[order][:-1], True]]
+            for i, row in zip(idx[last_of], last_of):
+                s = stats.setdefault(str(names[i]), [str(locations[i]), 0, 0.0, -np.inf, -np.inf, 0.0, 0.0, 0.0])
+                s[1] += int(counts[i])
+                s[2] += float(sums[i])
+                s[3] = max(s[3], float(maxes[i]))
+                if chunk["ts"][row] > s[4]:
+                    s[0] = str(locations[i])
+                    s[4], s[5] = float(chunk["ts"][row]), float(chunk["score"][row])
+                    s[6], s[7] = float(chunk["lat"][row]), float(chunk["lon"][row])
+        rank = {"mean": lambda s: s[2] / s[1], "max": lambda s: s[3], "latest": lambda s: s[5]}[by]
+        ranked = sorted(stats.items(), key=lambda item: -rank(item[1]))[:k]
+        return [{
+            "Location": s[0],
+            "lat": round(s[6], 4),
+            "lon": round(s[7], 4),
+            "predictions": s[1],
+            "mean": round(s[2] / s[1], 1),
+            "max": round(s[3], 1),
+            "latest": round(s[5], 1),
+            "latest_at": datetime.datetime.fromtimestamp(s[4], datetime.timezone.utc).isoformat(),
+        } for _, s in ranked]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or compact the prediction log.")
+    parser.add_argument("--compact", action="store_true", help="merge all segments now")
+    parser.add_argument("--top", action="store_true", help="print the riskiest locations")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    log = PredictionLog()
+    if args.compact:
+        print(f"Merged {log.compact(min_segments=1)} files")
+    if args.top:
+        now = time.time()
+        print(json.dumps(log.top(now - args.days * 86400, now, k=args.k), indent=2, ensure_ascii=False))
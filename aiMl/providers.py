@@ -0,0 +1,207 @@
+# providers.py
+import os
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from metrics import PROVIDER_SECONDS, PROVIDER_REQUESTS
+
+# Per-provider client settings:
+#   pool_size  - keep-alive connections kept open to the host
+#   rate/burst - token bucket (requests per second / max burst)
+#   retries    - extra attempts on connection errors, 429 and 5xx
+#   host       - origin that warm_up() opens a connection to
+PROVIDER_SETTINGS = {
+    "openweather": {"pool_size": 10, "rate": 1.0, "burst": 60, "retries": 2,
+                    "host": "https://api.openweathermap.org"},
+    "openmeteo": {"pool_size": 10, "rate": 10.0, "burst": 20, "retries": 2,
+                  "host": "https://api.open-meteo.com"},
+    "copernicus": {"pool_size": 10, "rate": 5.0, "burst": 10, "retries": 1,
+                   "host": "https://marine.copernicus.eu"},
+    "nasa_power": {"pool_size": 10, "rate": 2.0, "burst": 5, "retries": 2,
+                   "host": "https://power.larc.nasa.gov"},
+    "nominatim": {"pool_size": 2, "rate": 1.0, "burst": 1, "retries": 1,  # usage policy: max 1 req/s
+                  "host": "https://nominatim.openstreetmap.org"},
+    "google_maps": {"pool_size": 10, "rate": 20.0, "burst": 20, "retries": 1,
+                    "host": "https://maps.googleapis.com"},
+}
+
+RETRY_BACKOFF = float(os.getenv("PROVIDER_RETRY_BACKOFF", "0.5"))
+# Longest a caller will wait for a rate-limit token before giving up on the provider
+RATE_LIMIT_MAX_WAIT = float(os.getenv("PROVIDER_RATE_LIMIT_MAX_WAIT", "10"))
+# Set to 0 to skip the local token buckets (e.g. when benchmarking against the replay stub)
+RATE_LIMITS_ENABLED = os.getenv("PROVIDER_RATE_LIMITS", "1") != "0"
+BREAKER_FAILURES = int(os.getenv("PROVIDER_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("PROVIDER_BREAKER_RESET", "30"))
+USER_AGENT = "AquaScope/1.0"
+# Send every provider call to one local server instead (e.g. the replay stub in replay.py):
+# https://api.example.com/a/b -> {UPSTREAM_OVERRIDE_URL}/{provider}/a/b
+UPSTREAM_OVERRIDE_URL = os.getenv("UPSTREAM_OVERRIDE_URL", "").rstrip("/")
+
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider is throttled locally, its circuit is open, or retries are exhausted."""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        """Take one token, sleeping until one is available. Returns False if that would exceed max_wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > max_wait:
+                return False
+            # Reserve the token now so concurrent callers queue up behind us
+            self.tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive failures; lets one trial call through after `reset` seconds."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.count = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset:
+                self.opened_at = time.monotonic()  # half-open: one trial, re-arm for the rest
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.count = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.count += 1
+            if self.count >= self.failures:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "open"
+
+
+class ProviderClient:
+    """Pooled keep-alive session for one upstream host with rate limiting, retries and a circuit breaker."""
+
+    def __init__(self, name, pool_size=10, rate=5.0, burst=5, retries=2, host=None):
+        self.name = name
+        self.host = host
+        self.pool_size = pool_size
+        self.retries = retries
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+        self.session = self._new_session()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def reset_session(self):
+        """Drop pooled connections (e.g. after fork, sockets must not be shared between processes)."""
+        self.session = self._new_session()
+
+    def warm_up(self, timeout=3):
+        """
+        Open one keep-alive connection to the host (HEAD /) so the first real request skips DNS,
+        TCP and TLS setup. Any HTTP status counts; not rate limited, not recorded in the metrics.
+        """
+        url = f"{UPSTREAM_OVERRIDE_URL}/{self.name}/" if UPSTREAM_OVERRIDE_URL else f"{self.host}/"
+        self.session.head(url, timeout=timeout, allow_redirects=False).close()
+
+    def get(self, url, **kwargs):
+        if UPSTREAM_OVERRIDE_URL:
+            url = f"{UPSTREAM_OVERRIDE_URL}/{self.name}{urlsplit(url).path}"
+        if not self.breaker.allow():
+            PROVIDER_REQUESTS.inc(provider=self.name, outcome="circuit_open")
+            raise ProviderUnavailable(f"{self.name}: circuit open")
+        error = None
+        for attempt in range(self.retries + 1):
+            if RATE_LIMITS_ENABLED and not self.bucket.acquire():
+                PROVIDER_REQUESTS.inc(provider=self.name, outcome="throttled")
+                raise ProviderUnavailable(f"{self.name}: rate limit wait too long")
+            retry_after = None
+            try:
+                with PROVIDER_SECONDS.time(provider=self.name):
+                    r = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if r.status_code != 429 and r.status_code < 500:
+                    PROVIDER_REQUESTS.inc(provider=self.name, outcome="ok")
+                    self.breaker.success()
+                    return r
+                error = requests.HTTPError(f"{self.name}: HTTP {r.status_code}", response=r)
+                retry_after = r.headers.get("Retry-After")
+                # Give the connection back to the pool (stream=True responses otherwise hold it until GC)
+                r.close()
+            PROVIDER_REQUESTS.inc(provider=self.name, outcome="error")
+            if attempt < self.retries:
+                time.sleep(self._backoff(attempt, retry_after))
+        self.breaker.failure()
+        raise ProviderUnavailable(f"{self.name}: {error}") from error
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), RATE_LIMIT_MAX_WAIT)
+        # Full jitter exponential backoff
+        return random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+
+
+providers = {name: ProviderClient(name, **settings) for name, settings in PROVIDER_SETTINGS.items()}
+
+
+def http_get(provider, url, **kwargs):
+    """GET through the named provider's pooled client."""
+    return providers[provider].get(url, **kwargs)
+
+
+def reset_sessions():
+    for client in providers.values():
+        client.reset_session()
+
+
+def warm_up_sessions(names, timeout=3):
+    """Open a connection to each named provider's host concurrently; returns the names that failed."""
+    failed = []
+
+    def warm(name):
+        try:
+            providers[name].warm_up(timeout)
+        except requests.RequestException:
+            failed.append(name)
+
+    threads = [threading.Thread(target=warm, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return failed
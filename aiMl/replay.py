@@ -0,0 +1,140 @@
+# replay.py
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import datetime
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BASE_DIR, "fixtures", "replay")
+
+# /{provider}{upstream path} -> captured fixture
+ROUTES = {
+    "/openweather/geo/1.0/direct": "openweather_geocode.json",
+    "/openweather/data/2.5/weather": "openweather_current.json",
+    "/openmeteo/v1/archive": "openmeteo_archive.json",
+    "/copernicus/api/v1/nrt-data": "copernicus_marine.json",
+    "/nasa_power/api/temporal/daily/point": "nasa_power.json",
+    "/nominatim/search": "nominatim_search.json",
+}
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    fixtures = {}
+    for path, name in ROUTES.items():
+        with open(os.path.join(fixture_dir, name), encoding="utf-8") as f:
+            fixtures[path] = json.load(f)
+    return fixtures
+
+
+def place_coordinates(query):
+    """Stable pseudo-coordinate inside India for a place name, so replayed locations spread over many grid cells."""
+    h = int(hashlib.sha1(query.lower().encode()).hexdigest()[:8], 16)
+    return round(8.0 + (h % 2200) / 100.0, 4), round(70.0 + (h // 2200 % 2500) / 100.0, 4)
+
+
+def rebase_daily(template, start, end):
+    """Replay a captured Open-Meteo 'daily' block over the requested date range by cycling its values."""
+    first = datetime.date.fromisoformat(start)
+    n = (datetime.date.fromisoformat(end) - first).days + 1
+    daily = {"time": [(first + datetime.timedelta(days=i)).isoformat() for i in range(max(n, 0))]}
+    for var, values in template.items():
+        if var != "time":
+            daily[var] = [values[i % len(values)] for i in range(len(daily["time"]))]
+    return daily
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "AquaScopeReplay/1.0"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        fixture = self.server.fixtures.get(parts.path)
+        provider = parts.path.split("/")[1]
+        time.sleep(self.server.latency_for(provider))
+        if fixture is None:
+            return self._send(404, {"error": f"no fixture for {parts.path}"})
+        self.server.count(provider)
+        self._send(200, self.server.respond(parts.path, fixture, query))
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Local stand-in for every upstream provider, serving recorded fixtures with injected latency."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=None, jitter=0.0, fixture_dir=FIXTURE_DIR):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.fixtures = load_fixtures(fixture_dir)
+        self.latency = latency or {}  # provider -> seconds ("*" for the default)
+        self.jitter = jitter
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def latency_for(self, provider):
+        base = self.latency.get(provider, self.latency.get("*", 0.0))
+        return max(0.0, base + random.uniform(-self.jitter, self.jitter)) if base or self.jitter else 0.0
+
+    def count(self, provider):
+        with self._lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+
+    def respond(self, path, fixture, query):
+        if path == "/openweather/geo/1.0/direct":
+            lat, lon = place_coordinates(query.get("q", ""))
+            return [dict(fixture[0], name=query.get("q", ""), lat=lat, lon=lon)]
+        if path == "/nominatim/search":
+            lat, lon = place_coordinates(query.get("q", ""))
+            return [dict(fixture[0], display_name=query.get("q", ""), lat=str(lat), lon=str(lon))]
+        if path == "/openmeteo/v1/archive":
+            lats = query.get("latitude", "0").split(",")
+            lons = query.get("longitude", "0").split(",")
+            daily = rebase_daily(fixture["daily"], query["start_date"], query["end_date"])
+            items = [dict(fixture, latitude=float(la), longitude=float(lo), daily=daily) for la, lo in zip(lats, lons)]
+            return items if len(items) > 1 else items[0]
+        return fixture
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="replay", daemon=True).start()
+        return self
+
+
+def parse_latency(spec):
+    """'0.2' or 'openweather=0.3,nasa_power=1.5,*=0.1' -> {provider: seconds}"""
+    if not spec:
+        return {}
+    if "=" not in spec:
+        return {"*": float(spec)}
+    return {k.strip(): float(v) for k, v in (item.split("=") for item in spec.split(","))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded upstream responses for offline runs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="", help="seconds, or provider=seconds,... ('*' = default)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+    server = ReplayServer(args.port, parse_latency(args.latency), args.jitter)
+    print(f"Replaying fixtures on {server.url} (set UPSTREAM_OVERRIDE_URL={server.url})")
+    server.serve_forever()
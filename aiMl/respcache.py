@@ -0,0 +1,113 @@
+# respcache.py
+import os
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from metrics import CACHE_REQUESTS
+
+# Rendered responses are served as-is for this long...
+RESPONSE_FRESH_SECONDS = float(os.getenv("RESPONSE_FRESH_SECONDS", "300"))
+# ...and after that, for this much longer, served stale while one background refresh runs
+RESPONSE_STALE_SECONDS = float(os.getenv("RESPONSE_STALE_SECONDS", "3600"))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "2000"))
+
+
+class CachedResponse:
+    def __init__(self, body, mimetype, generated_at, complete=True):
+        self.complete = complete
+        self.body = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.mimetype = mimetype
+        self.generated_at = generated_at
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    @property
+    def age(self):
+        return time.time() - self.generated_at
+
+    @property
+    def generated_at_iso(self):
+        return datetime.datetime.fromtimestamp(self.generated_at, datetime.timezone.utc).isoformat()
+
+
+class RenderedResponseCache:
+    """
+    LRU of rendered response bodies with stale-while-revalidate.
+    render(generated_at) returns (body, mimetype, complete); it should raise on failure so errors are never
+    cached. Incomplete (degraded) renders are served but treated as stale at once, so the next request refreshes.
+    """
+
+    def __init__(self, executor, fresh=RESPONSE_FRESH_SECONDS, stale=RESPONSE_STALE_SECONDS,
+                 max_entries=RESPONSE_CACHE_ENTRIES):
+        self.executor = executor
+        self.fresh = fresh
+        self.stale = stale
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, render, accept_incomplete=True):
+        """
+        (CachedResponse or None, cache result) where the result is 'hit', 'stale' or 'miss'.
+        With accept_incomplete=False a degraded entry counts as a miss and is re-rendered in the foreground.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and not entry.complete and not accept_incomplete:
+                entry = None
+            if entry is not None and entry.age >= self.fresh + self.stale:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        if entry is not None and entry.complete and entry.age < self.fresh:
+            CACHE_REQUESTS.inc(cache="response", result="hit")
+            return entry, "hit"
+        if entry is not None:
+            CACHE_REQUESTS.inc(cache="response", result="stale")
+            self._schedule_refresh(key, render)
+            return entry, "stale"
+        CACHE_REQUESTS.inc(cache="response", result="miss")
+        return self._render(key, render), "miss"
+
+    def _render(self, key, render):
+        generated_at = time.time()
+        body, mimetype, complete = render(generated_at)
+        entry = CachedResponse(body, mimetype, generated_at, complete)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return entry
+
+    def _schedule_refresh(self, key, render):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._render(key, render)
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            self.executor.submit(refresh)
+        except RuntimeError:
+            # Executor shut down: keep serving the stale entry
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
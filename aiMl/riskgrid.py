@@ -0,0 +1,181 @@
+# riskgrid.py
+import os
+import json
+import math
+import time
+import datetime
+import argparse
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from main import INDIA_BOUNDS, features_for_coordinates, prefetch_coordinates
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GRID_DIR = os.getenv("RISK_GRID_DIR", os.path.join(BASE_DIR, "risk_grids"))
+GRID_STEP = float(os.getenv("RISK_GRID_STEP", "0.5"))
+GRID_WORKERS = int(os.getenv("RISK_GRID_WORKERS", "8"))
+# Cells fetched and scored together; each chunk is one vectorized model call
+GRID_CHUNK = int(os.getenv("RISK_GRID_CHUNK", "256"))
+LATEST_FILE = "latest.json"
+# Per-cell input quality, stored next to the risk array as <run_id>.status.npy
+CELL_STATUS = {0: "live", 1: "stale", 2: "default", 255: None}
+
+
+def grid_axes(step=GRID_STEP, bounds=INDIA_BOUNDS):
+    """Cell-centre latitudes and longitudes covering the bounds box."""
+    n_lat = int(math.ceil((bounds["lat_max"] - bounds["lat_min"]) / step))
+    n_lon = int(math.ceil((bounds["lon_max"] - bounds["lon_min"]) / step))
+    lats = bounds["lat_min"] + step * (np.arange(n_lat) + 0.5)
+    lons = bounds["lon_min"] + step * (np.arange(n_lon) + 0.5)
+    return lats, lons
+
+
+# ---------------- PRECOMPUTE ---------------- #
+def compute_grid(model, step=GRID_STEP, past_days=90, workers=GRID_WORKERS, grid_dir=GRID_DIR):
+    """
+    Score every grid cell and write the result as <run_id>.npy (float32, lat x lon) + <run_id>.json.
+    The array is filled through a memmap chunk by chunk, so memory stays flat for fine grids.
+    Each chunk is warmed with multi-location upstream requests before its per-cell fetches.
+    <run_id>.status.npy records per cell whether every source was live (0), some came from last
+    known values (1) or some fell back to constant defaults (2); the latter are stored as NaN.
+    """
+    lats, lons = grid_axes(step)
+    run_id = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S")
+    os.makedirs(grid_dir, exist_ok=True)
+    npy_path = os.path.join(grid_dir, f"{run_id}.npy")
+    risk = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.float32, shape=(len(lats), len(lons)))
+    risk[:] = np.nan
+    status = np.lib.format.open_memmap(os.path.join(grid_dir, f"{run_id}.status.npy"), mode="w+",
+                                       dtype=np.uint8, shape=(len(lats), len(lons)))
+    status[:] = 255
+
+    cells = [(i, j) for i in range(len(lats)) for j in range(len(lons))]
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for k in range(0, len(cells), GRID_CHUNK):
+            chunk = cells[k:k + GRID_CHUNK]
+            coords = [(float(lats[i]), float(lons[j])) for i, j in chunk]
+            prefetch_coordinates(coords, past_days)
+            features = list(pool.map(lambda c: features_for_coordinates(*c, past_days=past_days), coords))
+            scores = model.predict_scores(features)
+            for (i, j), f, score in zip(chunk, features, scores):
+                states = set(f["source_status"].values())
+                status[i, j] = 2 if "default" in states else 1 if "stale" in states else 0
+                risk[i, j] = np.nan if status[i, j] == 2 else score
+            print(f"Risk grid {run_id}: {min(k + GRID_CHUNK, len(cells))}/{len(cells)} cells")
+    risk.flush()
+    status.flush()
+    counts = {name: int(np.count_nonzero(status[:] == code)) for code, name in CELL_STATUS.items() if name}
+    del risk, status
+
+    meta = {
+        "run_id": run_id,
+        "step": step,
+        "bounds": INDIA_BOUNDS,
+        "shape": [len(lats), len(lons)],
+        "past_days": past_days,
+        "cells": counts,
+        "model_version": model.metadata.get("version"),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "seconds": round(time.time() - started, 1),
+    }
+    with open(os.path.join(grid_dir, f"{run_id}.json"), "w") as f:
+        json.dump(meta, f)
+    # Publish atomically so readers never see a half-written run
+    tmp = os.path.join(grid_dir, LATEST_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"run_id": run_id}, f)
+    os.replace(tmp, os.path.join(grid_dir, LATEST_FILE))
+    return meta
+
+
+# ---------------- QUERY ---------------- #
+class RiskGridReader:
+    """Serves bbox queries from the latest run, memory-mapped and reopened only when a new run is published."""
+
+    def __init__(self, grid_dir=GRID_DIR):
+        self.grid_dir = grid_dir
+        self._lock = threading.Lock()
+        self._run_id = None
+        self._meta = None
+        self._risk = None
+        self._status = None
+
+    def _latest(self):
+        try:
+            with open(os.path.join(self.grid_dir, LATEST_FILE)) as f:
+                run_id = json.load(f)["run_id"]
+        except (OSError, ValueError, KeyError):
+            return None, None, None
+        with self._lock:
+            if run_id != self._run_id:
+                with open(os.path.join(self.grid_dir, f"{run_id}.json")) as f:
+                    self._meta = json.load(f)
+                self._risk = np.load(os.path.join(self.grid_dir, f"{run_id}.npy"), mmap_mode="r")
+                status_path = os.path.join(self.grid_dir, f"{run_id}.status.npy")
+                # Runs from before the status mask existed have none
+                self._status = np.load(status_path, mmap_mode="r") if os.path.exists(status_path) else None
+                self._run_id = run_id
+            return self._meta, self._risk, self._status
+
+    def query_bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """Cells whose centres fall inside the box. Returns None when no grid has been computed yet."""
+        meta, risk, status = self._latest()
+        if meta is None:
+            return None
+        step, b = meta["step"], meta["bounds"]
+        i0 = max(0, int(math.ceil((lat_min - b["lat_min"]) / step - 0.5)))
+        i1 = min(risk.shape[0], int(math.floor((lat_max - b["lat_min"]) / step - 0.5)) + 1)
+        j0 = max(0, int(math.ceil((lon_min - b["lon_min"]) / step - 0.5)))
+        j1 = min(risk.shape[1], int(math.floor((lon_max - b["lon_min"]) / step - 0.5)) + 1)
+        i1, j1 = max(i0, i1), max(j0, j1)
+        block = np.asarray(risk[i0:i1, j0:j1], dtype=float)
+        result = {
+            "run_id": meta["run_id"],
+            "created_at": meta["created_at"],
+            "step": step,
+            "lats": [round(b["lat_min"] + step * (i + 0.5), 4) for i in range(i0, i1)],
+            "lons": [round(b["lon_min"] + step * (j + 0.5), 4) for j in range(j0, j1)],
+            "risk": [[None if np.isnan(v) else round(v, 1) for v in row] for row in block],
+        }
+        if status is not None:
+            result["status"] = [[CELL_STATUS.get(int(v)) for v in row] for row in status[i0:i1, j0:j1]]
+        return result
+
+
+def tile_bbox(z, x, y):
+    """(lat_min, lon_min, lat_max, lon_max) of a slippy-map (Web Mercator) tile."""
+    n = 2 ** z
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_of(y + 1), x / n * 360.0 - 180.0, lat_of(y), (x + 1) / n * 360.0 - 180.0
+
+
+# ---------------- SCHEDULER ---------------- #
+def start_scheduler(model, interval_hours, step=GRID_STEP):
+    """Recompute the grid every interval_hours on a daemon thread."""
+
+    def loop():
+        while True:
+            try:
+                compute_grid(model, step=step)
+            except Exception as e:
+                print("⚠️ Risk grid precompute failed:", e)
+            time.sleep(interval_hours * 3600)
+
+    t = threading.Thread(target=loop, name="risk-grid", daemon=True)
+    t.start()
+    return t
+
+
+if __name__ == "__main__":
+    from model import load_or_train
+
+    parser = argparse.ArgumentParser(description="Precompute the India risk grid (run from cron).")
+    parser.add_argument("--step", type=float, default=GRID_STEP, help="cell size in degrees")
+    parser.add_argument("--days", type=int, default=90, help="history window for hist_* features")
+    parser.add_argument("--workers", type=int, default=GRID_WORKERS)
+    args = parser.parse_args()
+    print(json.dumps(compute_grid(load_or_train(), step=args.step, past_days=args.days, workers=args.workers), indent=2))
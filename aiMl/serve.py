@@ -0,0 +1,108 @@
+# serve.py
+"""
+Production entry point: a pre-fork gunicorn server for app.py.
+
+The parent process loads the model once, then freezes the GC so forked workers share the
+sklearn forest's pages copy-on-write instead of each holding a copy. The flat evaluator's
+node arrays are memory-mapped read-only from the artifact's .npy files, so they are shared
+through the page cache regardless.
+Every worker then imports the Flask app with its own executors, SQLite connections and
+HTTP sessions, warms up, and only after that starts accepting requests. One worker,
+elected with app.py's BACKGROUND_LEADER_LOCK, also runs the background services (job
+resume, watchlist, prediction log compaction, risk grid refresh).
+
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+"""
+import os
+import gc
+import argparse
+import multiprocessing
+from gunicorn.app.base import BaseApplication
+from model import shared_model
+
+SERVE_BIND = os.getenv("SERVE_BIND", "0.0.0.0:5000")
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(multiprocessing.cpu_count())))
+# Request threads per worker (gthread worker class)
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "8"))
+SERVE_TIMEOUT = int(os.getenv("SERVE_TIMEOUT", "60"))
+# Places each worker fetches before accepting traffic, separated by ';' (names contain commas)
+WARMUP_LOCATIONS = [l.strip() for l in os.getenv("WARMUP_LOCATIONS", "").split(";") if l.strip()]
+# Providers each worker opens a pooled connection to before accepting traffic
+WARMUP_PROVIDERS = [p.strip() for p in os.getenv(
+    "WARMUP_PROVIDERS", "openweather,openmeteo,copernicus,nasa_power").split(",") if p.strip()]
+
+
+def preload():
+    """Runs in the parent before forking."""
+    model = shared_model()
+    model.predict({})  # fault in the mapped flat arrays once before forking
+    gc.collect()
+    # Keep the collector from writing to (and so copying) the inherited objects in every worker
+    gc.freeze()
+
+
+def warm_up(aquascope):
+    from providers import warm_up_sessions
+
+    aquascope.model.predict({})
+    failed = warm_up_sessions(WARMUP_PROVIDERS)
+    if failed:
+        print(f"⚠️ Worker {os.getpid()} could not pre-connect to:", ", ".join(failed))
+    for loc in WARMUP_LOCATIONS:
+        try:
+            aquascope.coalesced_features(loc, 90)
+        except Exception as e:
+            print(f"⚠️ Warm-up fetch for {loc} failed:", e)
+
+
+def load_worker_app():
+    """Runs in each worker after fork, before it accepts connections."""
+    from providers import reset_sessions
+    import app as aquascope
+
+    # Never share pooled sockets with the parent or sibling workers
+    reset_sessions()
+    warm_up(aquascope)
+    # Elect the background-services worker now rather than on its first request
+    aquascope.ensure_background_services()
+    return aquascope.app
+
+
+class AquaScopeServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return load_worker_app()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve AquaScope with pre-forked gunicorn workers.")
+    parser.add_argument("--bind", default=SERVE_BIND)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS)
+    parser.add_argument("--timeout", type=int, default=SERVE_TIMEOUT)
+    parser.add_argument("--executor-workers", type=int, help="batch/refresh pool size per worker (EXECUTOR_WORKERS)")
+    parser.add_argument("--fetch-workers", type=int, help="upstream fetch pool size per worker (FETCH_WORKERS)")
+    args = parser.parse_args()
+
+    # Read by app.py / main.py when each worker imports them
+    if args.executor_workers:
+        os.environ["EXECUTOR_WORKERS"] = str(args.executor_workers)
+    if args.fetch_workers:
+        os.environ["FETCH_WORKERS"] = str(args.fetch_workers)
+
+    preload()
+    AquaScopeServer({
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        "timeout": args.timeout,
+        "preload_app": False,
+    }).run()
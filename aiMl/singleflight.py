@@ -0,0 +1,49 @@
+# singleflight.py
+import threading
+from metrics import CACHE_REQUESTS
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of fn and all receive its result (or error)."""
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn, or wait for the running call with the same key. A follower waits at most `timeout`
+        seconds and then gets TimeoutError (the leader carries on); the leader itself is not bounded.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if leader else "hit")
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"{self.name}: shared call for {key!r} still running after {timeout:.2f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
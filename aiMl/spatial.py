@@ -0,0 +1,134 @@
+# spatial.py
+import os
+import math
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPATIAL_DB = os.getenv("SPATIAL_DB", os.path.join(BASE_DIR, "scored_locations.db"))
+# Bucket size (degrees) of the in-memory grid index
+SPATIAL_CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.25"))
+MAX_NEARBY_RADIUS_KM = float(os.getenv("MAX_NEARBY_RADIUS_KM", "1000"))
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ScoredLocationIndex:
+    """
+    Latest score per location, persisted in SQLite and indexed in memory by fixed-size
+    lat/lon buckets. A radius query only visits the buckets overlapping the search box
+    and then filters by exact haversine distance. Rows written by other processes
+    (serve.py workers) are picked up incrementally before each query.
+    """
+
+    def __init__(self, db_path=SPATIAL_DB, cell_deg=SPATIAL_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._records = {}  # key -> record dict
+        self._buckets = defaultdict(set)  # (i, j) -> keys
+        self._synced_at = 0.0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scored_locations (
+                    key TEXT PRIMARY KEY,
+                    location TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    score REAL NOT NULL,
+                    label TEXT,
+                    scored_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_scored_locations_scored_at ON scored_locations (scored_at)"
+            )
+            self._conn.commit()
+            self._catch_up()
+
+    def _catch_up(self):
+        """Index rows newer than the last sync (caller holds the lock)."""
+        # Overlap a few seconds so rows committed late by another process aren't skipped
+        rows = self._conn.execute(
+            "SELECT key, location, lat, lon, score, label, scored_at FROM scored_locations WHERE scored_at > ?",
+            (self._synced_at - 5,)
+        ).fetchall()
+        for row in rows:
+            self._index(dict(zip(("key", "location", "lat", "lon", "score", "label", "scored_at"), row)))
+            self._synced_at = max(self._synced_at, row[6])
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _index(self, record):
+        old = self._records.get(record["key"])
+        if old is not None:
+            self._buckets[self._cell(old["lat"], old["lon"])].discard(record["key"])
+        self._records[record["key"]] = record
+        self._buckets[self._cell(record["lat"], record["lon"])].add(record["key"])
+
+    def update(self, entries):
+        """Upsert (key, location, lat, lon, score, label) tuples, stamped with the current time."""
+        now = time.time()
+        rows = [(key, loc, float(lat), float(lon), float(score), label, now)
+                for key, loc, lat, lon, score, label in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scored_locations (key, location, lat, lon, score, label, scored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            for row in rows:
+                self._index(dict(zip(("key", "location", "lat", "lon", "score", "label", "scored_at"), row)))
+
+    def nearby(self, lat, lon, radius_km, k=10, sort="distance"):
+        """Up to k stored locations within radius_km, nearest first (or riskiest first with sort='risk')."""
+        radius_km = min(radius_km, MAX_NEARBY_RADIUS_KM)
+        dlat = radius_km / 111.0
+        # Longitude degrees shrink with latitude; near the poles just scan every longitude
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + dlat)))
+        dlon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (111.320 * cos_lat))
+        i0, j0 = self._cell(lat - dlat, lon - dlon)
+        i1, j1 = self._cell(lat + dlat, lon + dlon)
+        n_lon_cells = math.ceil(360.0 / self.cell_deg)
+
+        found = []
+        with self._lock:
+            self._catch_up()
+            for i in range(i0, i1 + 1):
+                for j in range(j0, min(j1, j0 + n_lon_cells - 1) + 1):
+                    # Wrap bucket indices across the antimeridian
+                    wrapped = (j + n_lon_cells // 2) % n_lon_cells - n_lon_cells // 2
+                    for key in self._buckets.get((i, wrapped), ()):
+                        r = self._records[key]
+                        d = haversine_km(lat, lon, r["lat"], r["lon"])
+                        if d <= radius_km:
+                            found.append((d, r))
+        if sort == "risk":
+            found.sort(key=lambda item: (-item[1]["score"], item[0]))
+        else:
+            found.sort(key=lambda item: item[0])
+        return [{
+            "Location": r["location"],
+            "lat": r["lat"],
+            "lon": r["lon"],
+            "distance_km": round(d, 2),
+            "Water Contamination Risk Score (%)": round(r["score"], 1),
+            "Risk Label": r["label"],
+            "scored_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(r["scored_at"])),
+        } for d, r in found[:k]]
+
+    def __len__(self):
+        return len(self._records)
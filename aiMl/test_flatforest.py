@@ -0,0 +1,53 @@
+# test_flatforest.py
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from flatforest import FlatForest, check_parity
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.RandomState(0)
+    X = rng.uniform(-50, 350, size=(400, 6))
+    y = X[:, 0] * 0.3 - X[:, 2] * 0.1 + rng.normal(0, 5, size=len(X))
+    return RandomForestRegressor(n_estimators=10, max_depth=5, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope="module")
+def flat(forest):
+    return FlatForest.from_sklearn(forest)
+
+
+def rows(n, n_features=6, seed=1):
+    return np.random.RandomState(seed).uniform(-50, 350, size=(n, n_features))
+
+
+def test_batch_matches_sklearn(forest, flat):
+    X = rows(500)
+    np.testing.assert_array_equal(flat.predict(X), forest.predict(X))
+
+
+def test_single_rows_match_sklearn(forest, flat):
+    for row in rows(20):
+        np.testing.assert_array_equal(flat.predict(row), forest.predict(row[None, :]))
+        np.testing.assert_array_equal(flat.predict(row[None, :]), forest.predict(row[None, :]))
+
+
+def test_rows_on_split_thresholds(forest, flat):
+    # A value equal to the threshold must go left (<=), as in sklearn
+    splits = np.flatnonzero(flat.left != np.arange(len(flat.left)))
+    X = rows(len(splits))
+    X[np.arange(len(splits)), flat.feature[splits]] = flat.threshold[splits].astype(np.float32)
+    np.testing.assert_array_equal(flat.predict(X), forest.predict(X))
+    for row in X[:20]:
+        np.testing.assert_array_equal(flat.predict(row), forest.predict(row[None, :]))
+    assert check_parity(forest, flat, X) == 0.0
+
+
+def test_save_load_roundtrip(forest, flat, tmp_path):
+    path = flat.save(str(tmp_path / "flat"))
+    loaded = FlatForest.load(path)
+    assert isinstance(loaded.threshold, np.memmap)
+    X = rows(100)
+    np.testing.assert_array_equal(loaded.predict(X), forest.predict(X))
@@ -0,0 +1,131 @@
+# tilecache.py
+import os
+import math
+import mmap
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from metrics import CACHE_REQUESTS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", os.path.join(BASE_DIR, "tile_cache"))
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+
+def tile_xy(lat, lon, zoom):
+    """Slippy-map (Web Mercator) tile containing the coordinate."""
+    n = 2 ** zoom
+    lat = max(-85.0511, min(85.0511, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(x, n - 1), min(y, n - 1)
+
+
+def tile_center(x, y, zoom):
+    n = 2 ** zoom
+    lon = (x + 0.5) / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / n))))
+    return round(lat, 6), round(lon, 6)
+
+
+class TileCache:
+    """
+    Content-addressed disk cache for map images, keyed by (tile, zoom, size, map_type).
+    Downloads stream straight into the cache file; total size is kept under max_bytes by LRU eviction.
+    """
+
+    def __init__(self, cache_dir=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks = defaultdict(threading.Lock)
+        self._files = OrderedDict()  # path -> size, least recently used first
+        self.total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(".png") and os.path.isfile(path):
+                st = os.stat(path)
+                existing.append((st.st_mtime, path, st.st_size))
+        for _, path, size in sorted(existing):
+            self._files[path] = size
+            self.total_bytes += size
+
+    def path_for(self, x, y, zoom, size, map_type):
+        digest = hashlib.sha1(f"{zoom}/{x}/{y}/{size}/{map_type}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def get(self, path):
+        """Cached path if present (and mark it recently used), else None."""
+        with self._lock:
+            if path not in self._files:
+                return None
+            self._files.move_to_end(path)
+        try:
+            os.utime(path)  # keep on-disk order in step for the next restart
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._files.pop(path, 0)
+            return None
+        return path
+
+    def fetch(self, path, open_stream):
+        """
+        Return the cached path, downloading it with open_stream() on a miss.
+        open_stream() must return a streaming requests.Response; concurrent misses for one key download once.
+        """
+        if self.get(path):
+            CACHE_REQUESTS.inc(cache="tile", result="hit")
+            return path
+        with self._key_lock(path):
+            if self.get(path):
+                CACHE_REQUESTS.inc(cache="tile", result="hit")
+                return path
+            CACHE_REQUESTS.inc(cache="tile", result="miss")
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+            try:
+                size = 0
+                with os.fdopen(fd, "wb") as f, open_stream() as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._add(path, size)
+            return path
+
+    def _key_lock(self, path):
+        with self._lock:
+            return self._key_locks[path]
+
+    def _add(self, path, size):
+        evicted = []
+        with self._lock:
+            self.total_bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            while self.total_bytes > self.max_bytes and len(self._files) > 1:
+                old, old_size = self._files.popitem(last=False)
+                self.total_bytes -= old_size
+                self._key_locks.pop(old, None)
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    @staticmethod
+    def view(path):
+        """Zero-copy memoryview of a cached file (backed by mmap, no read into Python memory)."""
+        with open(path, "rb") as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+tile_cache = TileCache()
@@ -0,0 +1,212 @@
+# train.py
+"""
+Offline training pipeline: builds the feature matrix from stored weather history
+joined with contamination labels, tunes a RandomForestRegressor on all cores and
+saves a versioned artifact through AquaScopeModel.save().
+
+    python train.py --db weather_history.db
+    python train.py --import-labels labels.csv
+"""
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import GridSearchCV
+from sklearn.metrics import mean_absolute_error, r2_score
+from history import WEATHER_HISTORY_DB
+from model import AquaScopeModel, FEATURE_ORDER, FEATURE_NAMES, MODEL_DIR
+
+# Rows pulled from SQLite per fetchmany() call
+TRAIN_CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", "50000"))
+# Look-back (days, including the labelled day) for the hist_* features; matches the serving default
+TRAIN_WINDOW_DAYS = int(os.getenv("TRAIN_WINDOW_DAYS", "90"))
+# Hyperparameter search runs on at most this many rows; the final fit uses everything
+TRAIN_SEARCH_ROWS = int(os.getenv("TRAIN_SEARCH_ROWS", "200000"))
+
+DEFAULT_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [8, 12, None],
+    "min_samples_leaf": [1, 5],
+    "max_features": [1.0, 0.5],
+}
+
+LABEL_COLUMNS = ["location", "date", "risk_score", "ndwi", "ndti", "solar_rad", "soil_moist"]
+
+# One row per labelled (location, date). Weather history is stored per location key
+# (see history.location_key), so labels must use the same key. The hist_* columns are
+# computed over the preceding window with SQL window functions, the same way
+# WeatherHistory.aggregates() does it at serving time.
+TRAINING_QUERY = """
+    WITH windowed AS (
+        SELECT location, date, temperature, humidity, wind_speed, aqi,
+               SUM(precipitation) OVER win AS hist_sum_precip,
+               AVG(temperature) OVER win AS hist_mean_temp,
+               AVG(wind_speed) OVER win AS hist_mean_wind,
+               FIRST_VALUE(temperature) OVER win AS first_temp,
+               COUNT(*) OVER win AS n_days
+        FROM weather_data
+        WHERE temperature IS NOT NULL
+        WINDOW win AS (PARTITION BY location ORDER BY julianday(date)
+                       RANGE BETWEEN :lookback PRECEDING AND CURRENT ROW)
+    )
+    SELECT w.temperature, w.humidity, w.wind_speed, w.hist_sum_precip,
+           l.ndwi, l.ndti,
+           w.hist_mean_temp, w.hist_mean_wind,
+           CASE WHEN w.n_days >= 2 THEN w.temperature - w.first_temp ELSE 0 END,
+           w.aqi, l.solar_rad, l.soil_moist,
+           l.risk_score
+    FROM contamination_labels l
+    JOIN windowed w ON w.location = l.location AND w.date = l.date
+    WHERE l.risk_score IS NOT NULL
+    ORDER BY l.date, l.location
+"""
+
+
+def ensure_labels_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS contamination_labels (
+            location TEXT NOT NULL,
+            date TEXT NOT NULL,
+            risk_score REAL,
+            ndwi REAL,
+            ndti REAL,
+            solar_rad REAL,
+            soil_moist REAL,
+            PRIMARY KEY (location, date)
+        )
+    """)
+    conn.commit()
+
+
+def import_labels(conn, csv_path):
+    """Upsert labels from a CSV with the LABEL_COLUMNS header; returns the number of rows read."""
+    ensure_labels_table(conn)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = [tuple(row.get(c) or None for c in LABEL_COLUMNS) for row in csv.DictReader(f)]
+    conn.executemany(
+        f"INSERT OR REPLACE INTO contamination_labels ({', '.join(LABEL_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    return len(rows)
+
+
+def load_training_data(conn, window_days=TRAIN_WINDOW_DAYS, chunk_rows=TRAIN_CHUNK_ROWS):
+    """
+    (X, y) as float32 arrays in FEATURE_ORDER, streamed from SQLite chunk by chunk
+    so peak memory stays close to the size of the final matrix.
+    """
+    ensure_labels_table(conn)
+    cursor = conn.execute(TRAINING_QUERY, {"lookback": window_days - 1})
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        # None (missing column values) becomes NaN and is filled with the feature defaults below
+        chunks.append(np.array(rows, dtype=np.float32))
+    if not chunks:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=np.float32), np.empty(0, dtype=np.float32)
+    data = np.concatenate(chunks)
+    del chunks
+    X, y = data[:, :-1], data[:, -1]
+    fill_defaults(X)
+    return np.ascontiguousarray(X), np.ascontiguousarray(y)
+
+
+def fill_defaults(X):
+    for i, (_, default) in enumerate(FEATURE_ORDER):
+        column = X[:, i]
+        column[np.isnan(column)] = default
+
+
+def search(X, y, grid=None, cv=3, search_rows=TRAIN_SEARCH_ROWS, n_jobs=-1, random_state=42):
+    """
+    Grid search with one process per (params, fold) fit; the forests inside run single-threaded
+    so the two levels of parallelism don't oversubscribe the CPU. Returns (best params, cv MAE).
+    """
+    if len(X) > search_rows:
+        idx = np.sort(np.random.RandomState(random_state).choice(len(X), search_rows, replace=False))
+        X, y = X[idx], y[idx]
+    gs = GridSearchCV(
+        RandomForestRegressor(n_jobs=1, random_state=random_state),
+        grid or DEFAULT_GRID,
+        cv=cv,
+        scoring="neg_mean_absolute_error",
+        n_jobs=n_jobs,
+        refit=False,
+        verbose=1,
+    )
+    gs.fit(X, y)
+    return gs.best_params_, -gs.best_score_
+
+
+def train(db_path=WEATHER_HISTORY_DB, model_dir=MODEL_DIR, grid=None, cv=3, holdout=0.15,
+          window_days=TRAIN_WINDOW_DAYS, search_rows=TRAIN_SEARCH_ROWS, n_jobs=-1):
+    """Load, tune, fit on all cores, evaluate on the most recent rows and save. Returns the artifact path."""
+    conn = sqlite3.connect(db_path)
+    try:
+        start = time.perf_counter()
+        X, y = load_training_data(conn, window_days)
+    finally:
+        conn.close()
+    if len(X) < 10:
+        raise ValueError(f"Only {len(X)} labelled rows found in {db_path}; import labels first")
+    print(f"Loaded {len(X)} rows in {time.perf_counter() - start:.1f}s")
+
+    # Rows are ordered by date, so the holdout is the most recent period
+    split = int(len(X) * (1 - holdout)) if holdout else len(X)
+    X_train, y_train = X[:split], y[:split]
+
+    start = time.perf_counter()
+    params, cv_mae = search(X_train, y_train, grid, cv, search_rows, n_jobs)
+    print(f"Best params {params} (cv MAE {cv_mae:.2f}) in {time.perf_counter() - start:.1f}s")
+
+    m = AquaScopeModel()
+    m.model = RandomForestRegressor(n_jobs=n_jobs, random_state=42, **params)
+    start = time.perf_counter()
+    m.model.fit(X_train, y_train)
+    print(f"Fitted on {len(X_train)} rows in {time.perf_counter() - start:.1f}s")
+
+    metadata = {"source": "train.py", "n_samples": int(len(X_train)), "params": params,
+                "window_days": window_days, "cv_mae": round(float(cv_mae), 3)}
+    if split < len(X):
+        pred = m.model.predict(X[split:])
+        metadata["holdout_mae"] = round(float(mean_absolute_error(y[split:], pred)), 3)
+        metadata["holdout_r2"] = round(float(r2_score(y[split:], pred)), 3)
+        print(f"Holdout ({len(X) - split} rows): MAE {metadata['holdout_mae']}, R2 {metadata['holdout_r2']}")
+
+    # Scoring in the server is single-row or small batches; don't keep a process-wide thread pool setting
+    m.model.set_params(n_jobs=None)
+    m._is_trained = True
+    m.metadata = metadata
+    return m.save(model_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the AquaScope model from stored weather history and labels.")
+    parser.add_argument("--db", default=WEATHER_HISTORY_DB, help="SQLite file with weather_data and contamination_labels")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--import-labels", metavar="CSV", help=f"upsert labels from a CSV ({','.join(LABEL_COLUMNS)}) and exit")
+    parser.add_argument("--grid", help="JSON parameter grid, overrides the default search space")
+    parser.add_argument("--cv", type=int, default=3)
+    parser.add_argument("--holdout", type=float, default=0.15, help="fraction of the most recent rows kept for evaluation")
+    parser.add_argument("--window-days", type=int, default=TRAIN_WINDOW_DAYS)
+    parser.add_argument("--search-rows", type=int, default=TRAIN_SEARCH_ROWS)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if args.import_labels:
+        conn = sqlite3.connect(args.db)
+        try:
+            print(f"Imported {import_labels(conn, args.import_labels)} labels into {args.db}")
+        finally:
+            conn.close()
+    else:
+        path = train(args.db, args.model_dir, json.loads(args.grid) if args.grid else None, args.cv,
+                     args.holdout, args.window_days, args.search_rows, args.n_jobs)
+        print("Model saved to", path)
@@ -0,0 +1,322 @@
+# watchlist.py
+"""
+Incremental monitoring of a list of locations.
+
+Each watched location keeps its last per-provider results, the feature vector it was
+last scored on, and that score. A heap holds the next due time of every
+(location, provider) pair, derived from the provider's cache TTL, so a tick refetches
+only the providers whose data has expired. Locations whose features moved by more
+than WATCH_DELTA are rescored together in one model call, and crossing a risk label
+boundary (50 / 75) appends an alert to a JSONL sink.
+"""
+import os
+import json
+import time
+import heapq
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import wait
+from cache import PROVIDER_CACHE
+from main import get_coordinates, fetch_provider, assemble_features, fetch_pool
+from model import FEATURE_NAMES, features_matrix, risk_label
+from geocache import normalize_name
+from metrics import WATCHLIST_EVENTS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WATCHLIST_DB = os.getenv("WATCHLIST_DB", os.path.join(BASE_DIR, "watchlist.db"))
+WATCH_ALERTS_PATH = os.getenv("WATCH_ALERTS_PATH", os.path.join(BASE_DIR, "alerts.jsonl"))
+# Rescore when any feature changes by more than this fraction of its previous value (absolute below 1.0)
+WATCH_DELTA = float(os.getenv("WATCH_DELTA", "0.05"))
+# Retry delay (seconds) for a provider fetch that failed; the last good value is kept meanwhile
+WATCH_RETRY_SECONDS = float(os.getenv("WATCH_RETRY_SECONDS", "300"))
+# Upper bound on (location, provider) refreshes handled per tick
+WATCH_MAX_PER_TICK = int(os.getenv("WATCH_MAX_PER_TICK", "500"))
+WATCH_MAX_LOCATIONS = int(os.getenv("WATCH_MAX_LOCATIONS", "10000"))
+
+PROVIDERS = list(PROVIDER_CACHE)
+
+
+def feature_vector(features):
+    return [float(v) for v in features_matrix([features])[0]]
+
+
+def moved(old_vector, new_vector, delta=WATCH_DELTA):
+    """True if any feature changed by more than delta, relative to max(|old|, 1)."""
+    if old_vector is None:
+        return True
+    return any(abs(n - o) > delta * max(abs(o), 1.0) for o, n in zip(old_vector, new_vector))
+
+
+class AlertSink:
+    """Appends alerts to a JSONL file; reads come from the file so every worker process sees them."""
+
+    def __init__(self, path=WATCH_ALERTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, alert):
+        line = json.dumps(alert, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        WATCHLIST_EVENTS.inc(event="alert")
+        print(f"🔔 {alert['Location']}: {alert['previous_label']} -> {alert['label']} ({alert['score']}%)")
+
+    def latest(self, limit=100):
+        """Most recent alerts first."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit)
+        alerts = []
+        for line in reversed(lines):
+            try:
+                alerts.append(json.loads(line))
+            except ValueError:
+                continue
+        return alerts
+
+
+class Watchlist:
+    def __init__(self, model, db_path=WATCHLIST_DB, sink=None, delta=WATCH_DELTA):
+        self.model = model
+        self.delta = delta
+        self.sink = sink or AlertSink()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._entries = {}  # key -> entry dict
+        self._heap = []  # (due_at, key, provider); stale heap items are skipped lazily
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS watchlist (
+                    key TEXT PRIMARY KEY,
+                    location TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    days INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    added_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+            for key, loc, lat, lon, days, state in self._conn.execute(
+                    "SELECT key, location, lat, lon, days, state FROM watchlist"):
+                self._load(key, loc, lat, lon, days, json.loads(state))
+
+    # ---------------- MEMBERSHIP ---------------- #
+    def _load(self, key, loc, lat, lon, days, state):
+        entry = {
+            "key": key, "location": loc, "lat": lat, "lon": lon, "days": days,
+            "sources": state.get("sources", {}),
+            "due": state.get("due", {}),
+            "vector": state.get("vector"),
+            "score": state.get("score"),
+            "scored_at": state.get("scored_at"),
+        }
+        self._entries[key] = entry
+        for provider in PROVIDERS:
+            heapq.heappush(self._heap, (entry["due"].setdefault(provider, 0), key, provider))
+
+    def add(self, location, days=90):
+        """Start watching a location (geocoded now); its first refresh runs on the next tick."""
+        key = normalize_name(location)
+        with self._lock:
+            if key in self._entries:
+                return self._summary(self._entries[key])
+            if len(self._entries) >= WATCH_MAX_LOCATIONS:
+                raise ValueError(f"Watchlist is full ({WATCH_MAX_LOCATIONS} locations)")
+        lat, lon = get_coordinates(location)
+        with self._lock:
+            if key not in self._entries:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO watchlist (key, location, lat, lon, days, state, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, location, lat, lon, days, "{}", time.time())
+                )
+                self._conn.commit()
+                self._load(key, location, lat, lon, days, {})
+            summary = self._summary(self._entries[key])
+        self._wake.set()
+        return summary
+
+    def remove(self, location):
+        key = normalize_name(location)
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._conn.execute("DELETE FROM watchlist WHERE key = ?", (key,))
+            self._conn.commit()
+        return True
+
+    def sync(self):
+        """Pick up locations added or removed by other processes (serve.py workers share the table)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, location, lat, lon, days, state FROM watchlist").fetchall()
+            keys = {row[0] for row in rows}
+            for key in [k for k in self._entries if k not in keys]:
+                del self._entries[key]
+            for key, loc, lat, lon, days, state in rows:
+                if key not in self._entries:
+                    self._load(key, loc, lat, lon, days, json.loads(state))
+
+    def entries(self):
+        """Summaries read from the table, so they are current whichever process runs the refresh loop."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, location, lat, lon, days, state FROM watchlist").fetchall()
+        summaries = []
+        for key, loc, lat, lon, days, state in rows:
+            state = json.loads(state)
+            summaries.append(self._summary({"location": loc, "lat": lat, "lon": lon, "days": days,
+                                            "score": state.get("score"), "scored_at": state.get("scored_at"),
+                                            "due": state.get("due", {})}))
+        return summaries
+
+    def _summary(self, entry):
+        score = entry["score"]
+        return {
+            "Location": entry["location"],
+            "lat": entry["lat"],
+            "lon": entry["lon"],
+            "days": entry["days"],
+            "Water Contamination Risk Score (%)": None if score is None else round(score, 1),
+            "Risk Label": None if score is None else risk_label(score),
+            "scored_at": entry["scored_at"],
+            "next_refresh_at": min(entry["due"].values()) if entry["due"] else None,
+        }
+
+    # ---------------- REFRESH ---------------- #
+    def _pop_due(self, now):
+        """Due (key, provider) pairs grouped by key, skipping heap items for removed or rescheduled pairs."""
+        due = {}
+        count = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and count < WATCH_MAX_PER_TICK:
+                due_at, key, provider = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry["due"].get(provider) != due_at:
+                    continue
+                if provider not in due.setdefault(key, []):
+                    due[key].append(provider)
+                    count += 1
+        return due
+
+    def tick(self, now=None):
+        """Refresh expired provider data, rescore what moved, emit alerts. Returns counts of the work done."""
+        now = time.time() if now is None else now
+        due = self._pop_due(now)
+        if not due:
+            return {"refreshed": 0, "rescored": 0, "alerts": 0}
+
+        futures = {}
+        with self._lock:
+            snapshot = {key: dict(self._entries[key]) for key in due if key in self._entries}
+        for key, providers in due.items():
+            entry = snapshot.get(key)
+            if entry is None:
+                continue
+            for provider in providers:
+                futures[fetch_pool().submit(fetch_provider, provider, entry["lat"], entry["lon"], entry["days"])] = \
+                    (key, provider)
+        wait(futures)
+
+        changed = {}
+        refreshed = 0
+        with self._lock:
+            for fut, (key, provider) in futures.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                try:
+                    entry["sources"][provider] = fut.result()
+                    entry["due"][provider] = now + PROVIDER_CACHE[provider]["ttl"]
+                    refreshed += 1
+                    WATCHLIST_EVENTS.inc(event="refresh")
+                except Exception as e:
+                    print(f"⚠️ Watchlist refresh of {provider} for {entry['location']} failed:", e)
+                    entry["due"][provider] = now + WATCH_RETRY_SECONDS
+                heapq.heappush(self._heap, (entry["due"][provider], key, provider))
+            for key in due:
+                entry = self._entries.get(key)
+                # Wait until every provider has answered at least once before scoring
+                if entry is None or any(p not in entry["sources"] for p in PROVIDERS):
+                    continue
+                features = assemble_features(entry["lat"], entry["lon"], entry["sources"])
+                vector = feature_vector(features)
+                if moved(entry["vector"], vector, self.delta):
+                    changed[key] = vector
+
+        alerts = []
+        if changed:
+            keys = list(changed)
+            scores = self.model.predict_scores([dict(zip(FEATURE_NAMES, changed[k])) for k in keys])
+            WATCHLIST_EVENTS.inc(len(keys), event="rescore")
+            with self._lock:
+                for key, score in zip(keys, scores):
+                    entry = self._entries.get(key)
+                    if entry is None:
+                        continue
+                    previous = entry["score"]
+                    entry.update(vector=changed[key], score=float(score), scored_at=now)
+                    alert = self._crossing(entry, previous)
+                    if alert:
+                        alerts.append(alert)
+        self._persist(due)
+        for alert in alerts:
+            self.sink.emit(alert)
+        return {"refreshed": refreshed, "rescored": len(changed), "alerts": len(alerts)}
+
+    def _crossing(self, entry, previous):
+        """Alert if the label changed (or a newly watched location starts above Low Risk)."""
+        label = risk_label(entry["score"])
+        previous_label = None if previous is None else risk_label(previous)
+        if label == previous_label or (previous is None and entry["score"] < 50):
+            return None
+        return {
+            "Location": entry["location"],
+            "lat": entry["lat"],
+            "lon": entry["lon"],
+            "previous_score": None if previous is None else round(previous, 1),
+            "score": round(entry["score"], 1),
+            "previous_label": previous_label,
+            "label": label,
+            "direction": "up" if previous is None or entry["score"] > previous else "down",
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry["scored_at"])),
+        }
+
+    def _persist(self, keys):
+        with self._lock:
+            rows = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    state = {k: entry[k] for k in ("sources", "due", "vector", "score", "scored_at")}
+                    rows.append((json.dumps(state), key))
+            self._conn.executemany("UPDATE watchlist SET state = ? WHERE key = ?", rows)
+            self._conn.commit()
+
+    # ---------------- BACKGROUND LOOP ---------------- #
+    def next_due(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def start(self, max_sleep=10):
+        """Run tick() on a daemon thread whenever work is due (woken early by add(), syncing at least every max_sleep)."""
+
+        def loop():
+            while True:
+                try:
+                    self.sync()
+                    self.tick()
+                except Exception as e:
+                    print("⚠️ Watchlist tick failed:", e)
+                nxt = self.next_due()
+                timeout = max_sleep if nxt is None else min(max_sleep, max(0.0, nxt - time.time()))
+                self._wake.wait(timeout)
+                self._wake.clear()
+
+        t = threading.Thread(target=loop, name="watchlist", daemon=True)
+        t.start()
+        return t
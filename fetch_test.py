@@ -3,7 +3,7 @@ import json
 import time
 
 # Flask endpoint
-BASE_URL = "http://127.0.0.1:5000/analyze"
+BASE_URL = "http://127.0.0.1:5000/api/predict"
 
 # List of locations (India + Abroad)
 LOCATIONS = [